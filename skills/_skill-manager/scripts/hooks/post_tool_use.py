@@ -71,7 +71,7 @@ def summarize_input(tool_input, tool_name):
         pattern = tool_input["pattern"]
         summary["has_pattern"] = True
         # Hash the pattern for privacy but uniqueness
-        summary["pattern_hash"] = hashlib.md5(pattern.encode()).hexdigest()[:8]
+        summary["pattern_hash"] = hashlib.blake2b(pattern.encode(), digest_size=4).hexdigest()
 
     if "glob" in tool_input or "path" in tool_input:
         summary["is_search"] = True
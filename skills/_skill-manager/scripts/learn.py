@@ -12,12 +12,11 @@ Generates skill candidates for approval.
 
 import json
 import os
-import sys
+import re
 from datetime import datetime, timedelta
 from pathlib import Path
 from collections import Counter, defaultdict
 from typing import Dict, List, Optional, Tuple
-import hashlib
 import uuid
 
 # Determine skills directory
@@ -27,6 +26,9 @@ CANDIDATES_DIR = SKILLS_DIR / ".skill-system" / "candidates"
 CONFIG_FILE = SKILLS_DIR / ".skill-system" / "config.json"
 ANALYTICS_FILE = SKILLS_DIR / ".skill-system" / "analytics.json"
 
+# Characters not allowed in generated skill names
+_UNSAFE_NAME_CHARS = re.compile(r"[^A-Za-z0-9-]")
+
 
 def load_config() -> dict:
     """Load configuration."""
@@ -54,21 +56,21 @@ def load_patterns(file_path: Path, days: int = 90) -> List[dict]:
     if not file_path.exists():
         return patterns
 
-    cutoff = datetime.utcnow() - timedelta(days=days)
+    # Timestamps are UTC ISO-8601, so they sort lexicographically and can be
+    # compared against the cutoff as plain strings.
+    cutoff_iso = (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%S")
 
     try:
         with open(file_path) as f:
             for line in f:
                 try:
                     record = json.loads(line.strip())
-                    # Parse timestamp and filter by age
-                    ts_str = record.get("timestamp", "")
-                    if ts_str:
-                        ts = datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
-                        if ts.replace(tzinfo=None) >= cutoff:
-                            patterns.append(record)
-                except (json.JSONDecodeError, ValueError):
+                except json.JSONDecodeError:
                     continue
+                # Filter by age
+                ts_str = record.get("timestamp", "")
+                if ts_str and ts_str >= cutoff_iso:
+                    patterns.append(record)
     except Exception:
         pass
 
@@ -96,13 +98,19 @@ def extract_tool_sequences(tool_patterns: List[dict]) -> List[Tuple[str, ...]]:
 
 def find_repeated_subsequences(sequences: List[Tuple[str, ...]], min_len: int = 3, max_len: int = 7) -> Dict[Tuple[str, ...], int]:
     """Find repeated subsequences across sessions using n-gram analysis."""
+    if min_len > max_len:
+        return {}
     ngram_counts = Counter()
 
     for seq in sequences:
-        # Generate all n-grams of varying lengths
-        for n in range(min_len, min(max_len + 1, len(seq) + 1)):
-            for i in range(len(seq) - n + 1):
-                ngram = seq[i:i + n]
+        # Generate all n-grams of varying lengths, extending the shortest
+        # n-gram at each start position rather than re-slicing per length
+        seq_len = len(seq)
+        for i in range(seq_len - min_len + 1):
+            ngram = seq[i:i + min_len]
+            ngram_counts[ngram] += 1
+            for n in range(min_len + 1, min(max_len, seq_len - i) + 1):
+                ngram = ngram + (seq[i + n - 1],)
                 ngram_counts[ngram] += 1
 
     # Filter to those appearing 2+ times
@@ -161,9 +169,14 @@ def calculate_candidate_score(
     sequence: Tuple[str, ...],
     frequency: int,
     domain_match: Optional[str],
-    config: dict
+    config: dict,
+    threshold: Optional[float] = None
 ) -> float:
-    """Calculate a score for a skill candidate."""
+    """Calculate a score for a skill candidate.
+
+    If threshold is given, returns 0.0 as soon as the frequency score shows
+    the candidate cannot reach it.
+    """
     learning_config = config.get("learning", {})
     min_freq = learning_config.get("min_frequency", 2)
     min_complexity = learning_config.get("min_complexity", 3)
@@ -172,6 +185,10 @@ def calculate_candidate_score(
     # Frequency score (30%)
     freq_score = min(frequency / (min_freq * 2), 1.0) * 0.3
 
+    # The remaining sub-scores add up to at most 0.7
+    if threshold is not None and round(freq_score + 0.7, 2) < threshold:
+        return 0.0
+
     # Complexity score (20%) - optimal is in the middle of the range
     seq_len = len(sequence)
     if min_complexity <= seq_len <= max_complexity:
@@ -191,20 +208,39 @@ def calculate_candidate_score(
     return round(freq_score + complexity_score + domain_score + distinctiveness_score, 2)
 
 
-def infer_domain_from_sequence(sequence: Tuple[str, ...], tool_patterns: List[dict]) -> Optional[str]:
-    """Infer domain from a tool sequence based on domain hints."""
-    # Collect domain hints from patterns that match this sequence's tools
-    domain_hints = Counter()
+def index_domain_hints(tool_patterns: List[dict]) -> Dict[str, Dict[str, List[int]]]:
+    """Index domain hints by tool as {tool: {hint: [count, first_seen]}}."""
+    tool_hints = defaultdict(dict)
 
-    for p in tool_patterns:
-        tool = p.get("tool")
-        if tool in sequence:
-            hint = p.get("input_summary", {}).get("domain_hint")
-            if hint:
-                domain_hints[hint] += 1
+    for i, p in enumerate(tool_patterns):
+        hint = p.get("input_summary", {}).get("domain_hint")
+        if hint:
+            entry = tool_hints[p.get("tool")].get(hint)
+            if entry:
+                entry[0] += 1
+            else:
+                tool_hints[p.get("tool")][hint] = [1, i]
+
+    return dict(tool_hints)
+
+
+def infer_domain_from_sequence(sequence: Tuple[str, ...], tool_hints: Dict[str, Dict[str, List[int]]]) -> Optional[str]:
+    """Infer domain from a tool sequence based on domain hints."""
+    # Combine domain hints from the tools in this sequence
+    domain_hints = {}
+
+    for tool in set(sequence):
+        for hint, (count, first_seen) in tool_hints.get(tool, {}).items():
+            entry = domain_hints.get(hint)
+            if entry:
+                entry[0] += count
+                entry[1] = min(entry[1], first_seen)
+            else:
+                domain_hints[hint] = [count, first_seen]
 
     if domain_hints:
-        return domain_hints.most_common(1)[0][0]
+        # Most frequent hint wins; ties go to the hint seen first
+        return min(domain_hints.items(), key=lambda kv: (-kv[1][0], kv[1][1]))[0]
     return None
 
 
@@ -225,7 +261,7 @@ def generate_skill_name(sequence: Tuple[str, ...], domain: Optional[str]) -> str
         name = f"workflow-{'-'.join(top_tools)}"
 
     # Ensure valid name (alphanumeric and dashes)
-    name = "".join(c if c.isalnum() or c == "-" else "-" for c in name)
+    name = _UNSAFE_NAME_CHARS.sub("-", name)
     return name[:50]  # Limit length
 
 
@@ -301,42 +337,43 @@ def generate_preview_skill(candidate: dict) -> str:
     description += f"Detected pattern: {' -> '.join(sequence[:5])}{'...' if len(sequence) > 5 else ''}. "
     description += f"Trigger phrases: {', '.join(triggers[:3])}."
 
-    preview = f"""---
-name: {name}
-description: {description}
-allowed-tools:
-{chr(10).join(f'  - {t}' for t in tools)}
-version: 1.0.0
-domain: {domain or 'general'}
-auto-generated: true
----
-
-# {name.replace('-', ' ').title()}
-
-Auto-generated skill based on detected usage patterns.
-
-## When to Use
-
-{chr(10).join(f'- {t}' for t in triggers)}
-
-## Workflow Pattern
-
-Detected tool sequence:
-```
-{' -> '.join(sequence)}
-```
-
-## Tools Required
-
-| Tool | Purpose |
-|------|---------|
-{chr(10).join(f'| {t} | Used in workflow |' for t in tools)}
-
----
-
-*This is a preview. Approve to activate this skill.*
-"""
-    return preview
+    parts = [
+        "---\n",
+        "name: ", name, "\n",
+        "description: ", description, "\n",
+        "allowed-tools:\n",
+        *(f"  - {t}\n" for t in tools),
+        "version: 1.0.0\n",
+        "domain: ", domain or "general", "\n",
+        "auto-generated: true\n",
+        "---\n",
+        "\n",
+        "# ", name.replace("-", " ").title(), "\n",
+        "\n",
+        "Auto-generated skill based on detected usage patterns.\n",
+        "\n",
+        "## When to Use\n",
+        "\n",
+        *(f"- {t}\n" for t in triggers),
+        "\n",
+        "## Workflow Pattern\n",
+        "\n",
+        "Detected tool sequence:\n",
+        "```\n",
+        " -> ".join(sequence), "\n",
+        "```\n",
+        "\n",
+        "## Tools Required\n",
+        "\n",
+        "| Tool | Purpose |\n",
+        "|------|---------|\n",
+        *(f"| {t} | Used in workflow |\n" for t in tools),
+        "\n",
+        "---\n",
+        "\n",
+        "*This is a preview. Approve to activate this skill.*\n",
+    ]
+    return "".join(parts)
 
 
 def load_existing_skills() -> List[str]:
@@ -392,6 +429,9 @@ def run_learning(verbose: bool = True) -> List[dict]:
         max_len=learning_config.get("max_complexity", 7)
     )
 
+    min_freq = learning_config.get("min_frequency", 2)
+    repeated = {ngram: count for ngram, count in repeated.items() if count >= min_freq}
+
     if verbose:
         print(f"  - Found {len(repeated)} repeated patterns")
 
@@ -406,19 +446,22 @@ def run_learning(verbose: bool = True) -> List[dict]:
             print(f"  - {domain}: {info['pattern_count']} patterns, {info['session_count']} sessions")
 
     # Load existing skills to avoid duplicates
-    existing_skills = load_existing_skills()
+    existing_skills = set(load_existing_skills())
 
     # Generate candidates
     if verbose:
         print("Generating candidates...")
 
+    # Index domain hints once rather than rescanning patterns per candidate
+    tool_hints = index_domain_hints(tool_patterns)
+
     candidates = []
     for sequence, frequency in repeated.items():
         # Infer domain
-        domain = infer_domain_from_sequence(sequence, tool_patterns)
+        domain = infer_domain_from_sequence(sequence, tool_hints)
 
         # Calculate score
-        score = calculate_candidate_score(sequence, frequency, domain, config)
+        score = calculate_candidate_score(sequence, frequency, domain, config, score_threshold)
 
         if score >= score_threshold:
             candidate = create_candidate(sequence, frequency, domain, score, domain_info)
@@ -15,12 +15,18 @@ Commands:
 - refine: Interactively improve a skill
 """
 
+import atexit
 import json
 import os
 import subprocess
 import sys
+from collections import deque
 from datetime import datetime
+from functools import lru_cache
+from itertools import islice
+from operator import itemgetter
 from pathlib import Path
+from types import SimpleNamespace
 from typing import Optional, List
 
 # Determine skills directory
@@ -28,6 +34,118 @@ SKILLS_DIR = Path(os.environ.get('SKILL_SYSTEM_DIR', Path.home() / ".claude" / "
 CANDIDATES_DIR = SKILLS_DIR / ".skill-system" / "candidates"
 CONFIG_FILE = SKILLS_DIR / ".skill-system" / "config.json"
 ANALYTICS_FILE = SKILLS_DIR / ".skill-system" / "analytics.json"
+META_CACHE_FILE = SKILLS_DIR / ".skill-system" / "meta-cache.json"
+
+# Parsed metadata keyed by path: {path: [mtime_ns, size, meta]}
+meta_cache = None
+meta_cache_dirty = False
+
+
+def save_meta_cache():
+    """Write the metadata cache back to disk if it changed."""
+    if not meta_cache_dirty:
+        return
+    try:
+        live = {path: cached for path, cached in meta_cache.items() if os.path.exists(path)}
+        META_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = f"{META_CACHE_FILE}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(live, f)
+        os.replace(tmp_file, META_CACHE_FILE)
+    except Exception:
+        pass
+
+
+@lru_cache(maxsize=512)
+def read_json_cached(path: str, mtime_ns: int, size: int) -> dict:
+    """Decode a JSON file; the stat arguments make edited files miss the cache."""
+    with open(path, "rb") as f:
+        return json.loads(f.read())
+
+
+def load_meta(path: str) -> dict:
+    """Load a JSON metadata file, reusing the cached copy if it is unchanged.
+
+    Raises FileNotFoundError if the file does not exist.
+    """
+    global meta_cache, meta_cache_dirty
+
+    st = os.stat(path)
+
+    if meta_cache is None:
+        try:
+            with open(META_CACHE_FILE) as f:
+                meta_cache = json.load(f)
+        except Exception:
+            meta_cache = {}
+        atexit.register(save_meta_cache)
+
+    cached = meta_cache.get(path)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+
+    meta = read_json_cached(path, st.st_mtime_ns, st.st_size)
+    meta_cache[path] = [st.st_mtime_ns, st.st_size, meta]
+    meta_cache_dirty = True
+    return meta
+
+
+def git_log_pygit2(skill_dir: Path, limit: int = 20) -> Optional[List[str]]:
+    """Return one-line commit summaries via pygit2, or None if it can't be used."""
+    try:
+        import pygit2
+    except ImportError:
+        return None
+
+    try:
+        repo_path = pygit2.discover_repository(str(skill_dir))
+        if not repo_path:
+            return None
+        repo = pygit2.Repository(repo_path)
+
+        # Tags mark skill versions, so show them like --decorate does
+        tags = {}
+        for ref_name in repo.references:
+            if ref_name.startswith("refs/tags/"):
+                target = repo.revparse_single(ref_name).peel(pygit2.Commit).id
+                tags.setdefault(target, []).append(f"tag: {ref_name[len('refs/tags/'):]}")
+
+        lines = []
+        for commit in repo.walk(repo.head.target, pygit2.GIT_SORT_TIME):
+            if len(lines) >= limit:
+                break
+            summary = commit.message.splitlines()[0] if commit.message else ""
+            decoration = f"({', '.join(tags[commit.id])}) " if commit.id in tags else ""
+            lines.append(f"{commit.short_id} {decoration}{summary}")
+        return lines
+    except (pygit2.GitError, KeyError, ValueError):
+        return None
+
+
+def git_checkout_pygit2(skill_dir: Path, ref: str) -> bool:
+    """Check out ref via pygit2. Returns False if pygit2 can't be used.
+
+    Raises RuntimeError if the checkout itself fails.
+    """
+    try:
+        import pygit2
+    except ImportError:
+        return False
+
+    repo_path = pygit2.discover_repository(str(skill_dir))
+    if not repo_path:
+        return False
+
+    try:
+        repo = pygit2.Repository(repo_path)
+        commit = repo.revparse_single(ref).peel(pygit2.Commit)
+        repo.checkout_tree(commit)
+        repo.set_head(commit.id)
+    except KeyError:
+        raise RuntimeError(f"unknown revision {ref}")
+    except (pygit2.GitError, ValueError) as e:
+        raise RuntimeError(str(e))
+    return True
 
 
 def cmd_list(args):
@@ -36,47 +154,39 @@ def cmd_list(args):
     print("=" * 60)
 
     skills = []
-    for item in SKILLS_DIR.iterdir():
-        if item.is_dir() and not item.name.startswith("."):
-            meta_file = item / "skill.meta.json"
-            if meta_file.exists():
-                try:
-                    with open(meta_file) as f:
-                        meta = json.load(f)
-                    skills.append({
-                        "name": item.name,
-                        "version": meta.get("version", "?"),
-                        "domain": meta.get("domain", "general"),
-                        "auto_generated": meta.get("auto_generated", False),
-                        "effectiveness": meta.get("effectiveness", {}),
-                    })
-                except Exception:
-                    skills.append({
-                        "name": item.name,
-                        "version": "?",
-                        "domain": "?",
-                        "auto_generated": False,
-                        "effectiveness": {},
-                    })
+    with os.scandir(SKILLS_DIR) as entries:
+        for entry in entries:
+            if entry.name.startswith(".") or not entry.is_dir():
+                continue
+            meta_file = os.path.join(entry.path, "skill.meta.json")
+            try:
+                meta = load_meta(meta_file)
+                success_rate = meta.get("effectiveness", {}).get("success_rate", 1.0)
+                skills.append((
+                    entry.name,
+                    meta.get("version", "?"),
+                    meta.get("domain", "general"),
+                    f"{success_rate:.0%}" if isinstance(success_rate, float) else "?",
+                    "auto" if meta.get("auto_generated", False) else "manual",
+                ))
+            except FileNotFoundError:
+                continue
+            except Exception:
+                skills.append((entry.name, "?", "?", "100%", "manual"))
 
     if not skills:
         print("No skills installed.")
         return
 
     # Sort by name
-    skills.sort(key=lambda x: x["name"])
+    skills.sort(key=itemgetter(0))
 
     # Print table
     print(f"{'Name':<30} {'Version':<10} {'Domain':<15} {'Success':<10} {'Type':<10}")
     print("-" * 60)
 
-    for skill in skills:
-        eff = skill["effectiveness"]
-        success_rate = eff.get("success_rate", 1.0)
-        success_str = f"{success_rate:.0%}" if isinstance(success_rate, float) else "?"
-        skill_type = "auto" if skill["auto_generated"] else "manual"
-
-        print(f"{skill['name']:<30} {skill['version']:<10} {skill['domain']:<15} {success_str:<10} {skill_type:<10}")
+    for name, version, domain, success_str, skill_type in skills:
+        print(f"{name:<30} {version:<10} {domain:<15} {success_str:<10} {skill_type:<10}")
 
     print(f"\nTotal: {len(skills)} skills")
 
@@ -97,17 +207,17 @@ def cmd_candidates(args):
         return
 
     candidates = []
-    for item in CANDIDATES_DIR.iterdir():
-        if item.is_dir():
-            meta_file = item / "candidate.json"
-            if meta_file.exists():
-                try:
-                    with open(meta_file) as f:
-                        candidate = json.load(f)
-                    if candidate.get("status") == "pending":
-                        candidates.append(candidate)
-                except Exception:
-                    pass
+    with os.scandir(CANDIDATES_DIR) as entries:
+        for entry in entries:
+            if not entry.is_dir():
+                continue
+            meta_file = os.path.join(entry.path, "candidate.json")
+            try:
+                candidate = load_meta(meta_file)
+                if candidate.get("status") == "pending":
+                    candidates.append((candidate.get("score", 0), candidate))
+            except Exception:
+                pass
 
     if not candidates:
         print("No pending candidates.")
@@ -115,13 +225,13 @@ def cmd_candidates(args):
         return
 
     # Sort by score
-    candidates.sort(key=lambda x: x.get("score", 0), reverse=True)
+    candidates.sort(key=itemgetter(0), reverse=True)
 
     print(f"{'ID':<20} {'Name':<25} {'Domain':<12} {'Score':<8} {'Freq':<6}")
     print("-" * 60)
 
-    for c in candidates:
-        print(f"{c['candidate_id']:<20} {c['skill_name']:<25} {c.get('domain', '?'):<12} {c.get('score', 0):<8.2f} {c.get('frequency', 0):<6}")
+    for score, c in candidates:
+        print(f"{c['candidate_id']:<20} {c['skill_name']:<25} {c.get('domain', '?'):<12} {score:<8.2f} {c.get('frequency', 0):<6}")
 
     print(f"\nTotal: {len(candidates)} pending candidates")
     print("\nUse 'manage.py approve <id>' to approve a candidate")
@@ -171,18 +281,22 @@ def cmd_history(args):
     print(f"Version History: {args.skill_name}")
     print("=" * 60)
 
-    # Try git log
-    try:
-        result = subprocess.run(
-            ["git", "log", "--oneline", "--decorate", "-20"],
-            cwd=skill_dir,
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        print(result.stdout)
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        print("Git history not available.")
+    # Read history in-process with pygit2, falling back to git log
+    log_lines = git_log_pygit2(skill_dir)
+    if log_lines is not None:
+        print("\n".join(log_lines) + "\n")
+    else:
+        try:
+            result = subprocess.run(
+                ["git", "log", "--oneline", "--decorate", "-20"],
+                cwd=skill_dir,
+                capture_output=True,
+                text=True,
+                check=True
+            )
+            print(result.stdout)
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            print("Git history not available.")
 
     # Show CHANGELOG if exists
     changelog_file = skill_dir / "CHANGELOG.md"
@@ -191,11 +305,10 @@ def cmd_history(args):
         print("-" * 40)
         with open(changelog_file) as f:
             # Print first 50 lines
-            for i, line in enumerate(f):
-                if i >= 50:
-                    print("... (truncated)")
-                    break
+            for line in islice(f, 50):
                 print(line.rstrip())
+            if f.read(1):
+                print("... (truncated)")
 
 
 def cmd_rollback(args):
@@ -217,13 +330,14 @@ def cmd_rollback(args):
     print(f"Rolling back {args.skill_name} to {version}...")
 
     try:
-        # Checkout the version
-        subprocess.run(
-            ["git", "checkout", version],
-            cwd=skill_dir,
-            capture_output=True,
-            check=True
-        )
+        # Checkout the version, in-process if pygit2 is available
+        if not git_checkout_pygit2(skill_dir, version):
+            subprocess.run(
+                ["git", "checkout", version],
+                cwd=skill_dir,
+                capture_output=True,
+                check=True
+            )
         print(f"Successfully rolled back to {version}")
 
         # Update metadata
@@ -239,6 +353,9 @@ def cmd_rollback(args):
     except subprocess.CalledProcessError as e:
         print(f"Rollback failed: {e.stderr.decode() if e.stderr else 'Unknown error'}")
         sys.exit(1)
+    except RuntimeError as e:
+        print(f"Rollback failed: {e}")
+        sys.exit(1)
     except FileNotFoundError:
         print("Git not available")
         sys.exit(1)
@@ -278,19 +395,19 @@ def cmd_stats(args):
     print("\nSkill Effectiveness:")
     print("-" * 40)
 
-    for item in SKILLS_DIR.iterdir():
-        if item.is_dir() and not item.name.startswith("."):
-            meta_file = item / "skill.meta.json"
-            if meta_file.exists():
-                try:
-                    with open(meta_file) as f:
-                        meta = json.load(f)
-                    eff = meta.get("effectiveness", {})
-                    usage = eff.get("usage_count", 0)
-                    success = eff.get("success_rate", 1.0)
-                    print(f"  {item.name}: {usage} uses, {success:.0%} success")
-                except Exception:
-                    pass
+    with os.scandir(SKILLS_DIR) as entries:
+        for entry in entries:
+            if entry.name.startswith(".") or not entry.is_dir():
+                continue
+            meta_file = os.path.join(entry.path, "skill.meta.json")
+            try:
+                meta = load_meta(meta_file)
+                eff = meta.get("effectiveness", {})
+                usage = eff.get("usage_count", 0)
+                success = eff.get("success_rate", 1.0)
+                print(f"  {entry.name}: {usage} uses, {success:.0%} success")
+            except Exception:
+                pass
 
 
 def cmd_improve(args):
@@ -332,11 +449,10 @@ def cmd_refine(args):
         print("\nCurrent SKILL.md (first 30 lines):")
         print("-" * 40)
         with open(skill_file) as f:
-            for i, line in enumerate(f):
-                if i >= 30:
-                    print("... (truncated)")
-                    break
+            for line in islice(f, 30):
                 print(line.rstrip())
+            if f.read(1):
+                print("... (truncated)")
 
     print("\nTo refine this skill:")
     print(f"1. Edit {skill_file}")
@@ -393,21 +509,50 @@ def cmd_prompts(args):
     # Get limit from args
     limit = int(args.skill_name) if args.skill_name and args.skill_name.isdigit() else 20
 
-    prompts = []
+    # Filter out warmup and shell commands if not verbose. The raw-line checks
+    # only pick out the lines that need decoding to confirm the match
+    show_all = getattr(args, 'force', False)
+
+    def keep(line):
+        if show_all or ('[shell]' not in line and 'warmup' not in line.lower()):
+            return True
+        try:
+            prompt = json.loads(line)['prompt']
+        except:
+            return False
+        return not (prompt.startswith('[shell]') or 'warmup' in prompt.lower())
+
+    # Keep only a tail of matching lines, with slack for lines that fail to decode
+    recent = deque(maxlen=limit * 4 or None)
+    kept = 0
     with open(prompts_file) as f:
         for line in f:
-            try:
-                prompts.append(json.loads(line))
-            except:
-                pass
+            if keep(line):
+                recent.append(line)
+                kept += 1
 
-    # Filter out warmup and shell commands if not verbose
-    if not getattr(args, 'force', False):
-        prompts = [p for p in prompts if not p['prompt'].startswith('[shell]')
-                   and 'warmup' not in p['prompt'].lower()]
-
-    # Show most recent first
-    prompts = prompts[-limit:][::-1]
+    # Show most recent first, decoding only as many lines as are shown
+    prompts = []
+    for line in reversed(recent):
+        if limit and len(prompts) == limit:
+            break
+        try:
+            prompts.append(json.loads(line))
+        except:
+            pass
+
+    # Too many broken lines in the tail: scan again, decoding as we go but
+    # still holding only the last `limit` prompts
+    if len(prompts) < limit and kept > len(recent):
+        recent = deque(maxlen=limit)
+        with open(prompts_file) as f:
+            for line in f:
+                if keep(line):
+                    try:
+                        recent.append(json.loads(line))
+                    except:
+                        pass
+        prompts = list(reversed(recent))
 
     for p in prompts:
         ts = p.get('timestamp', '')[:16]
@@ -419,6 +564,29 @@ def cmd_prompts(args):
 
 def main():
     """Main entry point."""
+    argv = sys.argv[1:]
+
+    # Simple read-only commands without flags skip argparse setup entirely
+    if argv and argv[0] in FAST_COMMANDS and not any(a.startswith("-") for a in argv[1:]):
+        args = SimpleNamespace(command=argv[0], args=argv[1:], quiet=False, force=False, json=False)
+    else:
+        args = parse_args()
+
+    # Parse positional arguments based on command
+    args.candidate_id = args.args[0] if args.args else None
+    args.skill_name = args.args[0] if args.args else None
+    args.version = args.args[1] if len(args.args) > 1 else None
+
+    handler = COMMANDS.get(args.command)
+    if handler:
+        handler(args)
+    else:
+        print(f"Unknown command: {args.command}")
+        sys.exit(1)
+
+
+def parse_args():
+    """Parse the full command line with argparse."""
     import argparse
 
     parser = argparse.ArgumentParser(
@@ -451,37 +619,29 @@ Commands:
     parser.add_argument("--force", "-f", action="store_true", help="Force action")
     parser.add_argument("--json", "-j", action="store_true", help="Output as JSON")
 
-    args = parser.parse_args()
-
-    # Parse positional arguments based on command
-    args.candidate_id = args.args[0] if args.args else None
-    args.skill_name = args.args[0] if args.args else None
-    args.version = args.args[1] if len(args.args) > 1 else None
-
-    # Dispatch to command handler
-    commands = {
-        "list": cmd_list,
-        "learn": cmd_learn,
-        "candidates": cmd_candidates,
-        "approve": cmd_approve,
-        "reject": cmd_reject,
-        "history": cmd_history,
-        "rollback": cmd_rollback,
-        "stats": cmd_stats,
-        "improve": cmd_improve,
-        "refine": cmd_refine,
-        "scan": cmd_scan,
-        "prompts": cmd_prompts,
-        "analyze": cmd_analyze,
-        "preferences": cmd_preferences,
-    }
-
-    handler = commands.get(args.command)
-    if handler:
-        handler(args)
-    else:
-        print(f"Unknown command: {args.command}")
-        sys.exit(1)
+    return parser.parse_args()
+
+
+# Command handlers
+COMMANDS = {
+    "list": cmd_list,
+    "learn": cmd_learn,
+    "candidates": cmd_candidates,
+    "approve": cmd_approve,
+    "reject": cmd_reject,
+    "history": cmd_history,
+    "rollback": cmd_rollback,
+    "stats": cmd_stats,
+    "improve": cmd_improve,
+    "refine": cmd_refine,
+    "scan": cmd_scan,
+    "prompts": cmd_prompts,
+    "analyze": cmd_analyze,
+    "preferences": cmd_preferences,
+}
+
+# Commands dispatched without argparse when given no flags
+FAST_COMMANDS = ("list", "candidates", "stats", "prompts")
 
 
 if __name__ == "__main__":
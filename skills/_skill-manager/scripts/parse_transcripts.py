@@ -5,14 +5,25 @@ parse_transcripts.py - Extract tool usage patterns from Claude Code transcripts.
 Alternative to hooks - parses transcript JSONL files directly.
 """
 
+import copy
+import io
 import json
+import mmap
 import os
+import re
 import hashlib
 from datetime import datetime, timedelta
 from pathlib import Path
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 import argparse
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 SKILLS_DIR = Path(os.environ.get('SKILL_SYSTEM_DIR', Path.home() / ".claude" / "skills"))
 PATTERNS_DIR = SKILLS_DIR / ".skill-system" / "patterns"
 SEQUENCES_FILE = PATTERNS_DIR / "tool-sequences.jsonl"
@@ -21,13 +32,75 @@ PROMPTS_LOG = PATTERNS_DIR / "user-prompts.jsonl"  # Full prompt log for learnin
 PROJECTS_DIR = Path.home() / ".claude" / "projects"
 STATE_FILE = PATTERNS_DIR / "parser-state.json"
 
+# orjson is optional; fall back to the stdlib json module
+if orjson:
+    json_loads = orjson.loads
+
+    def dumps_line(record):
+        return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+else:
+    json_loads = json.loads
+
+    def dumps_line(record):
+        return (json.dumps(record) + "\n").encode()
+
+# Transcripts larger than this are memory-mapped instead of read through
+# the buffered file object
+MMAP_THRESHOLD = 1 << 20
+
+BASH_INPUT_RE = re.compile(r'<bash-input>(.*?)</bash-input>', re.DOTALL)
+
+# Keywords that signal a domain in user prompts
+DOMAIN_KEYWORDS = {
+    "devops": ["docker", "kubernetes", "k8s", "deploy", "ci/cd", "pipeline", "terraform"],
+    "security": ["vulnerability", "security", "auth", "password", "encrypt", "owasp"],
+    "frontend": ["react", "vue", "css", "component", "ui", "tailwind", "next.js"],
+    "backend": ["api", "database", "server", "endpoint", "rest", "graphql"],
+    "git": ["commit", "branch", "merge", "rebase", "pull request", "pr"],
+    "data_science": ["pandas", "numpy", "model", "training", "dataset"],
+}
+KEYWORD_DOMAINS = {kw: domain for domain, kws in DOMAIN_KEYWORDS.items() for kw in kws}
+# One pass over the text; the lookahead reports keywords that overlap
+DOMAIN_KEYWORD_RE = re.compile(
+    "(?=(" + "|".join(re.escape(kw) for kw in KEYWORD_DOMAINS) + "))",
+    # ASCII-only case folding: Unicode folding would match e.g. "ſecurity",
+    # whose .lower() is not a KEYWORD_DOMAINS key
+    re.IGNORECASE | re.ASCII,
+)
+
+# Domain hints for common Bash commands
+DOMAIN_MAP = {
+    "docker": "devops", "docker-compose": "devops",
+    "kubectl": "devops", "helm": "devops", "terraform": "devops",
+    "git": "git", "gh": "git",
+    "npm": "frontend", "yarn": "frontend", "pnpm": "frontend",
+    "python": "backend", "pip": "backend", "pytest": "backend",
+    "python3": "backend", "pip3": "backend",
+}
+
+# Internal tools that carry no workflow signal
+SKIP_TOOLS = frozenset({"TodoWrite", "AskUserQuestion", "ExitPlanMode", "EnterPlanMode"})
+
+
+# Parsed parser-state.json as (mtime_ns, state); reloaded when the file changes
+state_cache = None
+
 
 def get_state():
     """Load parser state (last processed timestamps)."""
-    if STATE_FILE.exists():
-        with open(STATE_FILE) as f:
-            return json.load(f)
-    return {"processed_files": {}, "last_run": None}
+    global state_cache
+
+    try:
+        mtime_ns = STATE_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        return {"processed_files": {}, "last_run": None}
+
+    if state_cache is None or state_cache[0] != mtime_ns:
+        with open(STATE_FILE, "rb") as f:
+            state_cache = (mtime_ns, json_loads(f.read()))
+
+    # Callers update the state in place; keep the cached copy pristine
+    return copy.deepcopy(state_cache[1])
 
 
 def save_state(state):
@@ -46,157 +119,196 @@ def summarize_input(tool_input, tool_name):
 
     # File operations
     if "file_path" in tool_input:
-        path = Path(tool_input["file_path"])
-        summary["file_ext"] = path.suffix.lower() if path.suffix else "none"
-        summary["path_depth"] = len(path.parts)
+        file_path = tool_input["file_path"]
+        summary["file_ext"] = os.path.splitext(file_path)[1].lower() or "none"
+        summary["path_depth"] = file_path.count("/") + 1
 
     # Bash commands
     if "command" in tool_input and tool_name == "Bash":
         cmd = tool_input["command"].strip()
         if cmd:
-            parts = cmd.split()
-            primary_cmd = parts[0] if parts else ""
-            if "/" in primary_cmd:
-                primary_cmd = primary_cmd.split("/")[-1]
+            # Only the first word is needed; don't split the whole command
+            primary_cmd = cmd.split(None, 1)[0].rpartition("/")[2]
             summary["command"] = primary_cmd
 
             # Domain hints
-            domain_map = {
-                "docker": "devops", "docker-compose": "devops",
-                "kubectl": "devops", "helm": "devops", "terraform": "devops",
-                "git": "git", "gh": "git",
-                "npm": "frontend", "yarn": "frontend", "pnpm": "frontend",
-                "python": "backend", "pip": "backend", "pytest": "backend",
-                "python3": "backend", "pip3": "backend",
-            }
-            if primary_cmd in domain_map:
-                summary["domain_hint"] = domain_map[primary_cmd]
+            domain_hint = DOMAIN_MAP.get(primary_cmd)
+            if domain_hint:
+                summary["domain_hint"] = domain_hint
 
     # Search patterns
     if "pattern" in tool_input:
         summary["has_pattern"] = True
-        summary["pattern_hash"] = hashlib.md5(tool_input["pattern"].encode()).hexdigest()[:8]
+        summary["pattern_hash"] = hashlib.blake2b(tool_input["pattern"].encode(), digest_size=4).hexdigest()
 
     return summary
 
 
-def extract_domains(text):
-    """Extract domain signals from user prompts."""
-    text_lower = text.lower()
-    domains = []
+def extract_domains(text, first_only=False):
+    """Extract domain signals from user prompts.
+
+    With first_only, return just the first domain seen (presence checks).
+    """
+    found = set()
+
+    for match in DOMAIN_KEYWORD_RE.finditer(text):
+        domain = KEYWORD_DOMAINS[match.group(1).lower()]
+        if first_only:
+            return [domain]
+        found.add(domain)
+        if len(found) == len(DOMAIN_KEYWORDS):
+            break
+
+    return [domain for domain in DOMAIN_KEYWORDS if domain in found]
+
+
+def iter_lines(file_path):
+    """Yield the raw lines of a file as bytes, memory-mapping large files."""
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size <= MMAP_THRESHOLD:
+            yield from f
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0
+            while True:
+                end = mm.find(b"\n", start)
+                if end < 0:
+                    break
+                yield mm[start:end]
+                start = end + 1
+            if start < len(mm):
+                yield mm[start:]
+
+
+def parse_transcript(file_path, last_processed_time, seq_f, prompts_f, log_f):
+    """Parse a transcript file and stream tool usage patterns to the output files.
+
+    Returns (n_tools, n_prompts, n_full_prompts, latest_timestamp).
+    """
+    n_tools = n_prompts = n_full_prompts = 0
+    latest_ts = last_processed_time or ""
+    # Bind the per-record callables once for the loop below
+    loads = json_loads
+    write_tool = seq_f.write
+    write_prompt = prompts_f.write
+    write_log = log_f.write
 
-    domain_keywords = {
-        "devops": ["docker", "kubernetes", "k8s", "deploy", "ci/cd", "pipeline", "terraform"],
-        "security": ["vulnerability", "security", "auth", "password", "encrypt", "owasp"],
-        "frontend": ["react", "vue", "css", "component", "ui", "tailwind", "next.js"],
-        "backend": ["api", "database", "server", "endpoint", "rest", "graphql"],
-        "git": ["commit", "branch", "merge", "rebase", "pull request", "pr"],
-        "data_science": ["pandas", "numpy", "model", "training", "dataset"],
-    }
+    try:
+        for line in iter_lines(file_path):
+            # Entries are JSON objects; skip blank lines without decoding
+            if line[:1] != b"{":
+                continue
+            try:
+                entry = loads(line)
+            except ValueError:
+                continue
+
+            # Skip if before last processed time
+            timestamp = entry.get("timestamp")
+            if timestamp and last_processed_time:
+                if timestamp <= last_processed_time:
+                    continue
+            if timestamp and timestamp > latest_ts:
+                latest_ts = timestamp
 
-    for domain, keywords in domain_keywords.items():
-        if any(kw in text_lower for kw in keywords):
-            domains.append(domain)
+            entry_type = entry.get("type")
+            session_id = entry.get("sessionId", "unknown")
 
-    return domains
+            # Extract tool uses from assistant messages
+            if entry_type == "assistant":
+                message = entry.get("message", {})
+                content = message.get("content", [])
 
+                if isinstance(content, list):
+                    for item in content:
+                        if isinstance(item, dict) and item.get("type") == "tool_use":
+                            tool_name = item.get("name", "unknown")
+                            tool_input = item.get("input", {})
 
-def parse_transcript(file_path, last_processed_time=None):
-    """Parse a transcript file and extract tool usage patterns."""
-    tool_records = []
-    prompt_records = []
-    full_prompts = []  # Store full prompts for learning
+                            # Skip internal tools
+                            if tool_name in SKIP_TOOLS:
+                                continue
 
-    try:
-        with open(file_path) as f:
-            for line in f:
-                try:
-                    entry = json.loads(line.strip())
-                except json.JSONDecodeError:
+                            record = {
+                                "session_id": session_id,
+                                "timestamp": timestamp or datetime.utcnow().isoformat() + "Z",
+                                "tool": tool_name,
+                                "input_summary": summarize_input(tool_input, tool_name),
+                                "success": True,  # Assume success if in transcript
+                            }
+                            write_tool(dumps_line(record))
+                            n_tools += 1
+
+            # Extract user prompts
+            elif entry_type == "user":
+                message = entry.get("message", {})
+                content = message.get("content", "")
+
+                # Skip meta messages and non-text content
+                if entry.get("isMeta") or not isinstance(content, str):
                     continue
 
-                # Skip if before last processed time
-                timestamp = entry.get("timestamp")
-                if timestamp and last_processed_time:
-                    if timestamp <= last_processed_time:
-                        continue
-
-                entry_type = entry.get("type")
-                session_id = entry.get("sessionId", "unknown")
-
-                # Extract tool uses from assistant messages
-                if entry_type == "assistant":
-                    message = entry.get("message", {})
-                    content = message.get("content", [])
-
-                    if isinstance(content, list):
-                        for item in content:
-                            if isinstance(item, dict) and item.get("type") == "tool_use":
-                                tool_name = item.get("name", "unknown")
-                                tool_input = item.get("input", {})
-
-                                # Skip internal tools
-                                if tool_name in ["TodoWrite", "AskUserQuestion", "ExitPlanMode", "EnterPlanMode"]:
-                                    continue
-
-                                record = {
-                                    "session_id": session_id,
-                                    "timestamp": timestamp or datetime.utcnow().isoformat() + "Z",
-                                    "tool": tool_name,
-                                    "input_summary": summarize_input(tool_input, tool_name),
-                                    "success": True,  # Assume success if in transcript
-                                }
-                                tool_records.append(record)
-
-                # Extract user prompts
-                elif entry_type == "user":
-                    message = entry.get("message", {})
-                    content = message.get("content", "")
-
-                    # Skip meta messages
-                    if entry.get("isMeta"):
-                        continue
+                # Skip bash output (but keep bash input commands); one scan
+                # over the <bash-...> tags instead of a search per tag
+                bash_output = False
+                input_at = -1
+                idx = content.find("<bash-")
+                while idx >= 0:
+                    tag = content[idx + 6:idx + 13]
+                    if tag.startswith(("stdout>", "stderr>")):
+                        bash_output = True
+                        break
+                    if input_at < 0 and tag.startswith("input>"):
+                        input_at = idx
+                    idx = content.find("<bash-", idx + 6)
+                if bash_output:
+                    continue
 
-                    # Skip bash output (but keep bash input commands)
-                    if "<bash-stdout>" in content or "<bash-stderr>" in content:
+                if len(content) > 5:
+                    # Skip warmup/system messages
+                    if content.strip().lower() in ["warmup", "warmup..."]:
                         continue
 
-                    if isinstance(content, str) and len(content) > 5:
-                        # Skip warmup/system messages
-                        if content.strip().lower() in ["warmup", "warmup..."]:
-                            continue
-
-                        # Clean up bash input tags for logging
-                        clean_content = content
-                        if "<bash-input>" in content:
-                            # Extract just the command
-                            import re
-                            match = re.search(r'<bash-input>(.*?)</bash-input>', content)
-                            if match:
-                                clean_content = f"[shell] {match.group(1)}"
-
-                        # Store full prompt for learning
-                        full_prompts.append({
+                    # Clean up bash input tags for logging
+                    clean_content = content
+                    if input_at >= 0:
+                        # Extract just the command
+                        match = BASH_INPUT_RE.search(content, input_at)
+                        if match:
+                            clean_content = f"[shell] {match.group(1)}"
+
+                    # Store full prompt for learning
+                    write_log(dumps_line({
+                        "session_id": session_id,
+                        "timestamp": timestamp,
+                        "prompt": clean_content[:500],  # Cap at 500 chars
+                        "length": len(content),
+                    }))
+                    n_full_prompts += 1
+
+                    # Also extract domains for pattern analysis
+                    domains = extract_domains(content)
+                    if domains:
+                        write_prompt(dumps_line({
                             "session_id": session_id,
                             "timestamp": timestamp,
-                            "prompt": clean_content[:500],  # Cap at 500 chars
-                            "length": len(content),
-                        })
-
-                        # Also extract domains for pattern analysis
-                        domains = extract_domains(content)
-                        if domains:
-                            prompt_records.append({
-                                "session_id": session_id,
-                                "timestamp": timestamp,
-                                "domains": domains,
-                                "prompt_length": len(content),
-                            })
+                            "domains": domains,
+                            "prompt_length": len(content),
+                        }))
+                        n_prompts += 1
 
     except Exception as e:
         print(f"  Error parsing {file_path.name}: {e}")
 
-    return tool_records, prompt_records, full_prompts
+    return n_tools, n_prompts, n_full_prompts, latest_ts
+
+
+def parse_one(job):
+    """Parse one (file_path, last_processed_time) job into byte buffers; used by the worker pool."""
+    buffers = (io.BytesIO(), io.BytesIO(), io.BytesIO())
+    counts = parse_transcript(*job, *buffers)
+    return counts, [buf.getvalue() for buf in buffers]
 
 
 def main():
@@ -219,13 +331,18 @@ def main():
     cutoff = datetime.utcnow() - timedelta(days=args.days)
     transcript_files = []
 
-    for project_dir in PROJECTS_DIR.iterdir():
-        if project_dir.is_dir():
-            for jsonl_file in project_dir.glob("*.jsonl"):
-                # Check modification time
-                mtime = datetime.fromtimestamp(jsonl_file.stat().st_mtime)
-                if mtime >= cutoff:
-                    transcript_files.append(jsonl_file)
+    with os.scandir(PROJECTS_DIR) as project_dirs:
+        for project_dir in project_dirs:
+            if not project_dir.is_dir():
+                continue
+            with os.scandir(project_dir.path) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".jsonl") or not entry.is_file():
+                        continue
+                    # Check modification time
+                    mtime = datetime.fromtimestamp(entry.stat().st_mtime)
+                    if mtime >= cutoff:
+                        transcript_files.append(Path(entry.path))
 
     print(f"Found {len(transcript_files)} transcript files from last {args.days} days")
 
@@ -233,38 +350,36 @@ def main():
     total_prompts = 0
     total_full_prompts = 0
 
-    for tf in transcript_files:
-        file_key = str(tf)
-        last_processed = state["processed_files"].get(file_key)
-
-        if args.verbose:
-            print(f"  Processing: {tf.name}")
-
-        tool_records, prompt_records, full_prompts = parse_transcript(tf, last_processed)
-
-        if tool_records:
-            with open(SEQUENCES_FILE, "a") as f:
-                for record in tool_records:
-                    f.write(json.dumps(record) + "\n")
-            total_tools += len(tool_records)
-
-        if prompt_records:
-            with open(PROMPTS_FILE, "a") as f:
-                for record in prompt_records:
-                    f.write(json.dumps(record) + "\n")
-            total_prompts += len(prompt_records)
-
-        if full_prompts:
-            with open(PROMPTS_LOG, "a") as f:
-                for record in full_prompts:
-                    f.write(json.dumps(record) + "\n")
-            total_full_prompts += len(full_prompts)
-
-        # Update state with latest timestamp from this file
-        if tool_records or prompt_records or full_prompts:
-            all_timestamps = [r.get("timestamp") for r in tool_records + prompt_records + full_prompts if r.get("timestamp")]
-            if all_timestamps:
-                state["processed_files"][file_key] = max(all_timestamps)
+    jobs = [(tf, state["processed_files"].get(str(tf))) for tf in transcript_files]
+
+    # Parse transcripts in worker processes; a handful is faster serially.
+    # Workers hand back each file's output as bytes, written here in order;
+    # the serial path streams records straight into the output files.
+    with ProcessPoolExecutor() if len(jobs) >= 4 else nullcontext() as executor, \
+         open(SEQUENCES_FILE, "ab", buffering=1 << 20) as seq_f, \
+         open(PROMPTS_FILE, "ab", buffering=1 << 20) as prompts_f, \
+         open(PROMPTS_LOG, "ab", buffering=1 << 20) as log_f:
+        outputs = (seq_f, prompts_f, log_f)
+        if executor:
+            results = executor.map(parse_one, jobs, chunksize=4)
+        else:
+            results = ((parse_transcript(*job, *outputs), None) for job in jobs)
+
+        for tf, ((n_tools, n_prompts, n_full_prompts, latest_ts), chunks) in zip(transcript_files, results):
+            if args.verbose:
+                print(f"  Processed: {tf.name}")
+
+            if chunks:
+                for out, chunk in zip(outputs, chunks):
+                    out.write(chunk)
+
+            total_tools += n_tools
+            total_prompts += n_prompts
+            total_full_prompts += n_full_prompts
+
+            # Update state with latest timestamp from this file
+            if latest_ts:
+                state["processed_files"][str(tf)] = latest_ts
 
     # Save state
     save_state(state)
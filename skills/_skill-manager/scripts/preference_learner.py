@@ -11,13 +11,22 @@ Detects patterns that should change Claude's behavior:
 """
 
 import json
+import mmap
 import re
 import os
+import sqlite3
 from datetime import datetime, timedelta
 from pathlib import Path
 from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from typing import Dict, List, Set
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Use /home/agent for container environment, fallback to home dir
 AGENT_HOME = Path("/home/agent") if Path("/home/agent").exists() else Path.home()
 CLAUDE_DIR = Path(os.environ.get('CLAUDE_DIR', AGENT_HOME / ".claude"))
@@ -26,53 +35,293 @@ PATTERNS_DIR = SKILLS_DIR / ".skill-system" / "patterns"
 PROMPTS_LOG = PATTERNS_DIR / "user-prompts.jsonl"
 LEARNED_FILE = PATTERNS_DIR / "user-preferences.json"
 CLAUDE_MD = CLAUDE_DIR / "CLAUDE.md"
-
-
-def load_prompts(days: int = 30) -> List[str]:
-    """Load prompts from log file."""
-    prompts = []
+# Per-day detector counts plus the byte offset reached in PROMPTS_LOG, so
+# each run only parses prompts appended since the last one
+LEARNER_DB = PATTERNS_DIR / "learner.db"
+LEARNER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    day TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (kind, key, day)
+);
+CREATE INDEX IF NOT EXISTS counters_day ON counters (day);
+CREATE TABLE IF NOT EXISTS ingest_state (
+    name TEXT PRIMARY KEY,
+    value
+);
+"""
+COUNTER_KINDS = ("prompts", "combo", "bundle", "style", "skip", "words", "tech")
+# Bump when what the counters hold changes, so stored counts are rebuilt
+LEARNER_STATE_VERSION = 3
+
+# orjson is optional; fall back to the stdlib json module
+if orjson:
+    json_loads = orjson.loads
+
+    def json_dumps(obj, pretty=False):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+else:
+    json_loads = json.loads
+
+    def json_dumps(obj, pretty=False):
+        return json.dumps(obj, indent=2 if pretty else None).encode()
+
+# Pattern: "X and Y" or "X then Y" repeated = always do Y after X
+COMBO_PATTERNS = [
+    (re.compile(r'\b(commit)\b.*\b(push)\b'), 'after commit', 'push'),
+    (re.compile(r'\b(push)\b.*\b(commit)\b'), 'after commit', 'push'),  # reversed
+    (re.compile(r'\b(update docs?).*\b(commit)\b'), 'before commit', 'update docs'),
+    (re.compile(r'\b(test).*\b(commit)\b'), 'before commit', 'run tests'),
+    (re.compile(r'\b(commit).*\b(test)\b'), 'after commit', 'run tests'),
+    (re.compile(r'\b(build).*\b(deploy)\b'), 'before deploy', 'build'),
+    (re.compile(r'\b(lint).*\b(commit)\b'), 'before commit', 'lint'),
+]
+# Every combo mentions one of these; prompts without them skip the regexes
+COMBO_GATE = ("commit", "deploy")
+
+# Pattern: "run X and Y" or "start X and Y"
+BUNDLE_PATTERNS = [
+    (re.compile(r'\b(?:run|start|deploy)\s+(\w+)\s+and\s+(\w+)'), 'run together'),
+    (re.compile(r'\b(\w+)\s+and\s+(\w+)\s+(?:server|service)s?'), 'run together'),
+]
+BUNDLE_GATE = ("and",)
+
+SKIP_PATTERNS = [
+    (re.compile(r"don'?t\s+(?:add|include|put)\s+(\w+)"), "skip"),
+    (re.compile(r"no\s+(\w+)\s+(?:please|needed|necessary)"), "skip"),
+    (re.compile(r"skip\s+(?:the\s+)?(\w+)"), "skip"),
+    (re.compile(r"without\s+(?:the\s+)?(\w+)"), "skip"),
+]
+SKIP_GATE = ("don", "no", "skip", "without")
+
+# App/project names - proper nouns and domain-like words; matched against
+# the prompt as typed, since case is the whole signal
+PROJECT_NAME_RE = re.compile(r'\b([A-Z][a-z]+|[a-z]+\.(?:pro|com|io|dev|app))\b')
+
+# Words that look like names but aren't
+COMMON_WORDS = frozenset({
+    'the', 'this', 'that', 'with', 'from', 'have', 'been', 'will',
+    'and', 'you', 'for', 'what', 'can', 'how', 'but', 'not', 'are',
+    'was', 'were', 'there', 'here', 'when', 'where', 'why', 'who',
+    'get', 'got', 'use', 'run', 'add', 'new', 'all', 'some', 'any',
+    'like', 'just', 'now', 'then', 'also', 'more', 'about', 'into',
+    'make', 'sure', 'want', 'need', 'would', 'could', 'should',
+    'warmup', 'test', 'build', 'deploy', 'commit', 'push', 'pull',
+})
+
+# Tech stack mentions
+TECH_PATTERNS = [
+    re.compile(r'\buse\s+(gemini|openai|anthropic|gpt|claude)'),
+    re.compile(r'\b(react|vue|angular|next|nuxt)\b'),
+    re.compile(r'\b(python|node|typescript|rust|go)\b'),
+    re.compile(r'\b(postgres|mysql|mongo|redis)\b'),
+]
+
+
+def empty_counters() -> Dict[str, Counter]:
+    """One Counter per kind of signal the detectors aggregate."""
+    return {kind: Counter() for kind in COUNTER_KINDS}
+
+
+def encode_key(key) -> str:
+    """Store a counter key as text; tuple keys become JSON lists."""
+    return json.dumps(list(key) if isinstance(key, tuple) else key)
+
+
+def decode_key(text: str):
+    """Inverse of encode_key."""
+    key = json.loads(text)
+    return tuple(key) if isinstance(key, list) else key
+
+
+def open_learner_db() -> sqlite3.Connection:
+    """Open the counter store, creating its tables on first use."""
+    try:
+        # Wait out another run's ingest rather than failing on the lock
+        conn = sqlite3.connect(LEARNER_DB, timeout=60)
+        conn.executescript(LEARNER_SCHEMA)
+    except sqlite3.Error:
+        # No writable patterns dir; count this run in memory
+        conn = sqlite3.connect(":memory:")
+        conn.executescript(LEARNER_SCHEMA)
+    return conn
+
+
+def get_ingest_state(conn: sqlite3.Connection, days: int) -> dict:
+    """Read the ingest offset, clearing the counters if the log was replaced."""
+    state = dict(conn.execute("SELECT name, value FROM ingest_state"))
+    try:
+        log_stat = PROMPTS_LOG.stat()
+    except FileNotFoundError:
+        log_stat = None
+
+    # Counted differently, rotated or truncated log, or a wider window than
+    # the stored days cover
+    if (log_stat is None
+            or state.get("version") != LEARNER_STATE_VERSION
+            or state.get("inode") != str(log_stat.st_ino)
+            or state.get("offset", 0) > log_stat.st_size
+            or state.get("days", 0) < days):
+        conn.execute("DELETE FROM counters")
+        state = {"version": LEARNER_STATE_VERSION, "inode": None, "offset": 0, "days": days}
+    return state
+
+
+def ingest_prompts(conn: sqlite3.Connection, state: dict, cutoff_day: str):
+    """Fold prompts appended to the log since the last run into the day counters."""
     if not PROMPTS_LOG.exists():
-        return prompts
-
-    cutoff = datetime.utcnow() - timedelta(days=days)
-
-    with open(PROMPTS_LOG) as f:
-        for line in f:
-            try:
-                record = json.loads(line.strip())
-                ts_str = record.get("timestamp", "")
-                prompt = record.get("prompt", "")
-                if ts_str and prompt and not prompt.startswith("[shell]"):
-                    ts = datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
-                    if ts.replace(tzinfo=None) >= cutoff:
-                        prompts.append(prompt.lower().strip())
-            except:
-                continue
-
-    return prompts
+        return
+
+    by_day = defaultdict(list)
+    with open(PROMPTS_LOG, "rb") as f:
+        log_stat = os.fstat(f.fileno())
+        # st_ino can exceed SQLite's signed 64-bit integers
+        state["inode"] = str(log_stat.st_ino)
+        if log_stat.st_size <= state["offset"]:
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            mm.seek(state["offset"])
+            for line in iter(mm.readline, b""):
+                if not line.endswith(b"\n"):
+                    break  # Still being written; picked up next run
+                state["offset"] += len(line)
+                try:
+                    record = json_loads(line)
+                    ts_str = record.get("timestamp", "")
+                    prompt = record.get("prompt", "")
+                    if ts_str and prompt and not prompt.startswith("[shell]"):
+                        day = ts_str[:10]
+                        if day >= cutoff_day:
+                            by_day[day].append(prompt.strip())
+                except:
+                    continue
+
+    # A rebuild covers the whole window; count its days in worker processes.
+    # A routine run only adds a day or two and stays in-process.
+    with ProcessPoolExecutor() if len(by_day) >= 4 else nullcontext() as executor:
+        batches = list(by_day.values())
+        results = executor.map(count_prompts, batches) if executor else map(count_prompts, batches)
+        conn.executemany(
+            "INSERT INTO counters (kind, key, day, count) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (kind, key, day) DO UPDATE SET count = count + excluded.count",
+            (
+                (kind, encode_key(key), day, count)
+                for day, day_counts in zip(by_day, results)
+                for kind, counts in day_counts.items()
+                for key, count in counts.items() if count
+            ),
+        )
+
+
+def load_window_counts(days: int = 30) -> Dict[str, Counter]:
+    """Update the day counters from the log and sum the ones inside the window."""
+    # Counters are keyed by UTC day, so the window is whole days
+    cutoff_day = (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%d")
+
+    conn = open_learner_db()
+    try:
+        # Offset and counters commit together, so an interrupted run is redone.
+        # Take the write lock before reading the offset so concurrent runs
+        # can't both ingest the same tail of the log
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            state = get_ingest_state(conn, days)
+            ingest_prompts(conn, state, cutoff_day)
+            conn.execute("DELETE FROM counters WHERE day < ?", (cutoff_day,))
+            conn.executemany("INSERT OR REPLACE INTO ingest_state (name, value) VALUES (?, ?)", state.items())
+
+        totals = empty_counters()
+        # First-seen order keeps rule lists and most_common ties stable
+        for kind, key, count in conn.execute(
+            "SELECT kind, key, SUM(count) FROM counters WHERE day >= ? GROUP BY kind, key ORDER BY MIN(rowid)",
+            (cutoff_day,),
+        ):
+            totals[kind][decode_key(key)] = count
+        return totals
+    finally:
+        conn.close()
+
+
+def count_prompts(raw_prompts: List[str]) -> Dict[str, Counter]:
+    """Count every detector's signals in one pass over a batch of prompts."""
+    combo_counts = Counter()
+    bundle_counts = Counter()
+    skip_counts = Counter()
+    word_counts = Counter()
+    tech_counts = Counter()
+    too_long = too_short = unnatural = formality = more_casual = more_formal = 0
+
+    for raw_prompt in raw_prompts:
+        # Project names are matched as typed; case is the whole signal
+        word_counts.update(PROJECT_NAME_RE.findall(raw_prompt))
+
+        # Lowercase once; the other patterns are all written in lowercase
+        prompt = raw_prompt.lower()
+
+        # Workflow combos, counted once per prompt
+        if any(word in prompt for word in COMBO_GATE):
+            combo_counts.update(
+                (when, action) for pattern, when, action in COMBO_PATTERNS if pattern.search(prompt)
+            )
+
+        # Bundled commands
+        if any(word in prompt for word in BUNDLE_GATE):
+            bundle_counts.update(
+                tuple(sorted(match))  # Normalize order
+                for pattern, bundle_type in BUNDLE_PATTERNS
+                for match in pattern.findall(prompt) if len(match) == 2
+            )
+
+        # Things to skip
+        if any(word in prompt for word in SKIP_GATE):
+            skip_counts.update(
+                match for pattern, _ in SKIP_PATTERNS for match in pattern.findall(prompt) if len(match) > 2
+            )
+
+        # Tech stack mentions
+        tech_counts.update(match for pattern in TECH_PATTERNS for match in pattern.findall(prompt))
+
+        # Response length
+        if 'too long' in prompt:
+            too_long += 1
+        if 'too short' in prompt or 'more detail' in prompt:
+            too_short += 1
+        # Naturalness
+        if 'person wouldn' in prompt or 'human' in prompt or 'natural' in prompt:
+            unnatural += 1
+        # Formality, and which way; both directions contain "formal" or "casual"
+        if 'formal' in prompt or 'casual' in prompt:
+            formality += 1
+            if 'too formal' in prompt or 'more casual' in prompt:
+                more_casual += 1
+            if 'more formal' in prompt or 'too casual' in prompt:
+                more_formal += 1
+
+    return {
+        "prompts": Counter({"total": len(raw_prompts)}),
+        "combo": combo_counts,
+        "bundle": bundle_counts,
+        "style": Counter({
+            "too_long": too_long,
+            "too_short": too_short,
+            "unnatural": unnatural,
+            "formality": formality,
+            "more_casual": more_casual,
+            "more_formal": more_formal,
+        }),
+        "skip": skip_counts,
+        "words": word_counts,
+        "tech": tech_counts,
+    }
 
 
-def detect_workflow_rules(prompts: List[str]) -> List[dict]:
+def detect_workflow_rules(combo_counts: Counter) -> List[dict]:
     """Detect implicit workflow rules from repeated patterns."""
     rules = []
 
-    # Pattern: "X and Y" or "X then Y" repeated = always do Y after X
-    combo_patterns = [
-        (r'\b(commit)\b.*\b(push)\b', 'after commit', 'push'),
-        (r'\b(push)\b.*\b(commit)\b', 'after commit', 'push'),  # reversed
-        (r'\b(update docs?).*\b(commit)\b', 'before commit', 'update docs'),
-        (r'\b(test).*\b(commit)\b', 'before commit', 'run tests'),
-        (r'\b(commit).*\b(test)\b', 'after commit', 'run tests'),
-        (r'\b(build).*\b(deploy)\b', 'before deploy', 'build'),
-        (r'\b(lint).*\b(commit)\b', 'before commit', 'lint'),
-    ]
-
-    combo_counts = Counter()
-    for prompt in prompts:
-        for pattern, when, action in combo_patterns:
-            if re.search(pattern, prompt, re.IGNORECASE):
-                combo_counts[(when, action)] += 1
-
     # If pattern appears 2+ times, it's a rule
     for (when, action), count in combo_counts.items():
         if count >= 2:
@@ -86,26 +335,10 @@ def detect_workflow_rules(prompts: List[str]) -> List[dict]:
     return rules
 
 
-def detect_bundled_commands(prompts: List[str]) -> List[dict]:
+def detect_bundled_commands(bundle_counts: Counter) -> List[dict]:
     """Detect things that should run together."""
     bundles = []
 
-    # Pattern: "run X and Y" or "start X and Y"
-    bundle_patterns = [
-        (r'\b(?:run|start|deploy)\s+(\w+)\s+and\s+(\w+)', 'run together'),
-        (r'\b(\w+)\s+and\s+(\w+)\s+(?:server|service)s?', 'run together'),
-    ]
-
-    bundle_counts = defaultdict(int)
-    for prompt in prompts:
-        for pattern, bundle_type in bundle_patterns:
-            matches = re.findall(pattern, prompt, re.IGNORECASE)
-            for match in matches:
-                if len(match) == 2:
-                    # Normalize order
-                    items = tuple(sorted([match[0], match[1]]))
-                    bundle_counts[items] += 1
-
     for items, count in bundle_counts.items():
         if count >= 2:
             bundles.append({
@@ -118,13 +351,13 @@ def detect_bundled_commands(prompts: List[str]) -> List[dict]:
     return bundles
 
 
-def detect_response_preferences(prompts: List[str]) -> List[dict]:
+def detect_response_preferences(style_counts: Counter) -> List[dict]:
     """Detect preferences about response style."""
     prefs = []
 
     # Response length
-    too_long = sum(1 for p in prompts if 'too long' in p)
-    too_short = sum(1 for p in prompts if 'too short' in p or 'more detail' in p)
+    too_long = style_counts["too_long"]
+    too_short = style_counts["too_short"]
 
     if too_long >= 2:
         prefs.append({
@@ -140,7 +373,7 @@ def detect_response_preferences(prompts: List[str]) -> List[dict]:
         })
 
     # Naturalness
-    unnatural = sum(1 for p in prompts if 'person wouldn' in p or 'human' in p or 'natural' in p)
+    unnatural = style_counts["unnatural"]
     if unnatural >= 1:
         prefs.append({
             "type": "style",
@@ -149,36 +382,20 @@ def detect_response_preferences(prompts: List[str]) -> List[dict]:
         })
 
     # Formality
-    too_formal = sum(1 for p in prompts if 'formal' in p or 'casual' in p)
-    if too_formal >= 1:
+    if style_counts["formality"] >= 1:
         # Check which way
-        if any('too formal' in p or 'more casual' in p for p in prompts):
+        if style_counts["more_casual"]:
             prefs.append({"type": "style", "rule": "be more casual"})
-        elif any('more formal' in p or 'too casual' in p for p in prompts):
+        elif style_counts["more_formal"]:
             prefs.append({"type": "style", "rule": "be more formal"})
 
     return prefs
 
 
-def detect_skip_preferences(prompts: List[str]) -> List[dict]:
+def detect_skip_preferences(skip_counts: Counter) -> List[dict]:
     """Detect things to NOT do unless asked."""
     skips = []
 
-    skip_patterns = [
-        (r"don'?t\s+(?:add|include|put)\s+(\w+)", "skip"),
-        (r"no\s+(\w+)\s+(?:please|needed|necessary)", "skip"),
-        (r"skip\s+(?:the\s+)?(\w+)", "skip"),
-        (r"without\s+(?:the\s+)?(\w+)", "skip"),
-    ]
-
-    skip_counts = Counter()
-    for prompt in prompts:
-        for pattern, _ in skip_patterns:
-            matches = re.findall(pattern, prompt, re.IGNORECASE)
-            for match in matches:
-                if len(match) > 2:
-                    skip_counts[match] += 1
-
     for item, count in skip_counts.items():
         if count >= 1:  # Even once is significant for "don't" statements
             skips.append({
@@ -190,46 +407,19 @@ def detect_skip_preferences(prompts: List[str]) -> List[dict]:
     return skips
 
 
-def detect_project_context(prompts: List[str]) -> List[dict]:
+def detect_project_context(word_counts: Counter, tech_counts: Counter) -> List[dict]:
     """Detect project-specific context."""
     context = []
 
     # App/project names - look for repeated proper nouns
-    words = []
-    for p in prompts:
-        words.extend(re.findall(r'\b([A-Z][a-z]+|[a-z]+\.(?:pro|com|io|dev|app))\b', p, re.IGNORECASE))
-
-    word_counts = Counter(words)
-    # Filter out common words
-    common = {'the', 'this', 'that', 'with', 'from', 'have', 'been', 'will',
-              'and', 'you', 'for', 'what', 'can', 'how', 'but', 'not', 'are',
-              'was', 'were', 'there', 'here', 'when', 'where', 'why', 'who',
-              'get', 'got', 'use', 'run', 'add', 'new', 'all', 'some', 'any',
-              'like', 'just', 'now', 'then', 'also', 'more', 'about', 'into',
-              'make', 'sure', 'want', 'need', 'would', 'could', 'should',
-              'warmup', 'test', 'build', 'deploy', 'commit', 'push', 'pull'}
     for word, count in word_counts.most_common(10):
-        if word.lower() not in common and count >= 3 and len(word) > 3:
+        if word.lower() not in COMMON_WORDS and count >= 3 and len(word) > 3:
             if '.' in word:
                 context.append({"type": "url", "value": word, "times_mentioned": count})
             else:
                 context.append({"type": "project_name", "value": word, "times_mentioned": count})
 
     # Tech stack mentions
-    tech_patterns = [
-        r'\buse\s+(gemini|openai|anthropic|gpt|claude)',
-        r'\b(react|vue|angular|next|nuxt)\b',
-        r'\b(python|node|typescript|rust|go)\b',
-        r'\b(postgres|mysql|mongo|redis)\b',
-    ]
-
-    tech_counts = Counter()
-    for prompt in prompts:
-        for pattern in tech_patterns:
-            matches = re.findall(pattern, prompt, re.IGNORECASE)
-            for match in matches:
-                tech_counts[match.lower()] += 1
-
     for tech, count in tech_counts.most_common(5):
         if count >= 2:
             context.append({"type": "tech", "value": tech, "times_mentioned": count})
@@ -243,27 +433,28 @@ def run_preference_learning(verbose: bool = True, update_claude: bool = False) -
         print("Learning User Preferences")
         print("=" * 60)
 
-    prompts = load_prompts(days=30)
+    counts = load_window_counts(days=30)
+    prompt_count = counts["prompts"]["total"]
 
     if verbose:
-        print(f"Analyzing {len(prompts)} prompts...\n")
+        print(f"Analyzing {prompt_count} prompts...\n")
 
-    if not prompts:
+    if not prompt_count:
         if verbose:
             print("No prompts to analyze. Run 'manage.py scan' first.")
         return {}
 
     # Detect all preference types
-    workflow_rules = detect_workflow_rules(prompts)
-    bundles = detect_bundled_commands(prompts)
-    style_prefs = detect_response_preferences(prompts)
-    skip_prefs = detect_skip_preferences(prompts)
-    context = detect_project_context(prompts)
+    workflow_rules = detect_workflow_rules(counts["combo"])
+    bundles = detect_bundled_commands(counts["bundle"])
+    style_prefs = detect_response_preferences(counts["style"])
+    skip_prefs = detect_skip_preferences(counts["skip"])
+    context = detect_project_context(counts["words"], counts["tech"])
 
     # Build learned object
     learned = {
         "updated_at": datetime.utcnow().isoformat() + "Z",
-        "prompts_analyzed": len(prompts),
+        "prompts_analyzed": prompt_count,
         "rules": {
             "workflows": workflow_rules,
             "bundles": bundles,
@@ -307,8 +498,8 @@ def run_preference_learning(verbose: bool = True, update_claude: bool = False) -
 
     # Save
     try:
-        with open(LEARNED_FILE, "w") as f:
-            json.dump(learned, f, indent=2)
+        with open(LEARNED_FILE, "wb") as f:
+            f.write(json_dumps(learned, pretty=True))
         if verbose:
             print(f"✅ Saved to: {LEARNED_FILE}")
     except Exception as e:
@@ -384,10 +575,16 @@ def update_claude_md(learned: dict, verbose: bool = True) -> bool:
 
     new_section = f"\n{start_marker}\n" + "\n".join(sections) + f"\n{end_marker}\n"
 
-    if start_marker in content:
-        # Replace existing
-        pattern = f"{start_marker}.*?{end_marker}"
-        content = re.sub(pattern, new_section.strip(), content, flags=re.DOTALL)
+    start = content.find(start_marker)
+    if start >= 0:
+        # Replace existing; the markers are fixed strings, so slice around them
+        replacement = new_section.strip()
+        while start >= 0:
+            end = content.find(end_marker, start + len(start_marker))
+            if end < 0:
+                break
+            content = content[:start] + replacement + content[end + len(end_marker):]
+            start = content.find(start_marker, start + len(replacement))
     else:
         # Append
         content = content.rstrip() + "\n" + new_section
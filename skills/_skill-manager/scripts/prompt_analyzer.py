@@ -10,20 +10,44 @@ Analyzes:
 """
 
 import json
+import mmap
 import re
 import os
 from datetime import datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
+from bisect import bisect_right
 from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, List, Tuple, Optional
 import hashlib
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 SKILLS_DIR = Path(os.environ.get('SKILL_SYSTEM_DIR', Path.home() / ".claude" / "skills"))
 PATTERNS_DIR = SKILLS_DIR / ".skill-system" / "patterns"
 PROMPTS_LOG = PATTERNS_DIR / "user-prompts.jsonl"
 TOOL_SEQUENCES = PATTERNS_DIR / "tool-sequences.jsonl"
 PROMPT_PATTERNS = PATTERNS_DIR / "learned-prompt-patterns.json"
 
+# Below this many prompts, worker start-up costs more than it saves
+PARALLEL_MIN_PROMPTS = 5000
+
+# orjson is optional; fall back to the stdlib json module
+if orjson:
+    json_loads = orjson.loads
+
+    def json_dumps(obj, pretty=False):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+else:
+    json_loads = json.loads
+
+    def json_dumps(obj, pretty=False):
+        return json.dumps(obj, indent=2 if pretty else None).encode()
+
 
 # Intent categories with trigger phrases
 INTENT_PATTERNS = {
@@ -75,6 +99,56 @@ ACTION_VERBS = [
     "stop", "test", "try", "update", "upgrade", "use", "view", "write"
 ]
 
+# One alternation per intent, compiled once at import
+INTENT_REGEXES = {
+    intent: re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+    for intent, patterns in INTENT_PATTERNS.items()
+}
+# Look for "verb X" or "verb the X" patterns; the lookahead lets a match
+# start at every verb, so "run test suite" yields (run, test) and (test, suite)
+ACTION_OBJECT_RE = re.compile(
+    rf'\b(?=({"|".join(ACTION_VERBS)})\s+(?:the\s+)?([a-z][a-z0-9_-]*))'
+)
+# Pairs are reported in ACTION_VERBS order, which decides most_common() ties
+VERB_ORDER = {verb: i for i, verb in enumerate(ACTION_VERBS)}
+
+# Words too common to say anything about a prompt
+STOPWORDS = frozenset({
+    'a', 'an', 'the', 'is', 'are', 'was', 'were', 'be', 'been', 'being',
+    'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
+    'should', 'may', 'might', 'must', 'shall', 'can', 'need', 'dare',
+    'to', 'of', 'in', 'for', 'on', 'with', 'at', 'by', 'from', 'as',
+    'into', 'through', 'during', 'before', 'after', 'above', 'below',
+    'between', 'under', 'again', 'further', 'then', 'once', 'here',
+    'there', 'when', 'where', 'why', 'how', 'all', 'each', 'few', 'more',
+    'most', 'other', 'some', 'such', 'no', 'nor', 'not', 'only', 'own',
+    'same', 'so', 'than', 'too', 'very', 'just', 'and', 'but', 'if', 'or',
+    'because', 'as', 'until', 'while', 'of', 'at', 'by', 'about', 'against',
+    'i', 'me', 'my', 'myself', 'we', 'our', 'you', 'your', 'he', 'him',
+    'she', 'her', 'it', 'its', 'they', 'them', 'what', 'which', 'who',
+    'this', 'that', 'these', 'those', 'am', 'is', 'are', 'was', 'were',
+    'ok', 'okay', 'yes', 'no', 'yeah', 'yep', 'nope', 'sure', 'cool',
+    'great', 'good', 'nice', 'thanks', 'please', 'pls', 'thx', 'ty',
+    'u', 'ur', 'im', 'dont', 'cant', 'wont', 'isnt', 'arent', 'wasnt',
+})
+
+SHELL_PREFIX_RE = re.compile(r'^\[shell\]\s*')
+WORD_RE = re.compile(r'\b[a-z][a-z0-9_-]*\b')
+
+
+def iter_log_lines(path: Path):
+    """Yield the raw lines of a JSONL log through a memory map."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from iter(mm.readline, b"")
+
+
+def cutoff_timestamp(days: int) -> str:
+    """ISO cutoff string; log timestamps are UTC ISO-8601 and compare as strings."""
+    return (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%S")
+
 
 def load_prompts(days: int = 30) -> List[dict]:
     """Load prompts from log file."""
@@ -82,19 +156,18 @@ def load_prompts(days: int = 30) -> List[dict]:
     if not PROMPTS_LOG.exists():
         return prompts
 
-    cutoff = datetime.utcnow() - timedelta(days=days)
-
-    with open(PROMPTS_LOG) as f:
-        for line in f:
-            try:
-                record = json.loads(line.strip())
-                ts_str = record.get("timestamp", "")
-                if ts_str:
-                    ts = datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
-                    if ts.replace(tzinfo=None) >= cutoff:
-                        prompts.append(record)
-            except:
-                continue
+    cutoff = cutoff_timestamp(days)
+
+    for line in iter_log_lines(PROMPTS_LOG):
+        try:
+            record = json_loads(line)
+            ts_str = record.get("timestamp", "")
+            if ts_str and ts_str >= cutoff:
+                # Lowercased once here for every detector downstream
+                record["prompt_lc"] = (record.get("prompt") or "").lower()
+                prompts.append(record)
+        except:
+            continue
 
     return prompts
 
@@ -104,86 +177,72 @@ def load_tool_sequences(days: int = 30) -> Dict[str, List[dict]]:
     if not TOOL_SEQUENCES.exists():
         return {}
 
-    cutoff = datetime.utcnow() - timedelta(days=days)
+    cutoff = cutoff_timestamp(days)
     sessions = defaultdict(list)
 
-    with open(TOOL_SEQUENCES) as f:
-        for line in f:
-            try:
-                record = json.loads(line.strip())
-                ts_str = record.get("timestamp", "")
-                if ts_str:
-                    ts = datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
-                    if ts.replace(tzinfo=None) >= cutoff:
-                        session_id = record.get("session_id", "unknown")
-                        sessions[session_id].append(record)
-            except:
-                continue
+    for line in iter_log_lines(TOOL_SEQUENCES):
+        try:
+            record = json_loads(line)
+            ts_str = record.get("timestamp", "")
+            if ts_str and ts_str >= cutoff:
+                session_id = record.get("session_id", "unknown")
+                sessions[session_id].append(record)
+        except:
+            continue
 
     return dict(sessions)
 
 
-def detect_intent(prompt: str) -> List[str]:
-    """Detect intents from a prompt."""
-    prompt_lower = prompt.lower()
-    intents = []
-
-    for intent, patterns in INTENT_PATTERNS.items():
-        for pattern in patterns:
-            if re.search(pattern, prompt_lower):
-                intents.append(intent)
-                break
+# Prompt logs repeat themselves ("yes", "continue", retried prompts), so the
+# per-prompt extractors are memoised; they return tuples so results are shared
+@lru_cache(maxsize=4096)
+def detect_intent(prompt_lc: str) -> Tuple[str, ...]:
+    """Detect intents from a lowercased prompt."""
+    return tuple(intent for intent, pattern in INTENT_REGEXES.items() if pattern.search(prompt_lc))
 
-    return intents
 
-
-def extract_keywords(prompt: str) -> List[str]:
-    """Extract meaningful keywords from prompt."""
-    # Clean and tokenize
-    prompt_lower = prompt.lower()
+@lru_cache(maxsize=4096)
+def extract_keywords(prompt_lc: str) -> Tuple[str, ...]:
+    """Extract meaningful keywords from a lowercased prompt."""
     # Remove shell prefix
-    prompt_lower = re.sub(r'^\[shell\]\s*', '', prompt_lower)
+    prompt_lower = SHELL_PREFIX_RE.sub('', prompt_lc)
     # Split into words
-    words = re.findall(r'\b[a-z][a-z0-9_-]*\b', prompt_lower)
+    words = WORD_RE.findall(prompt_lower)
 
     # Filter stopwords
-    stopwords = {
-        'a', 'an', 'the', 'is', 'are', 'was', 'were', 'be', 'been', 'being',
-        'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
-        'should', 'may', 'might', 'must', 'shall', 'can', 'need', 'dare',
-        'to', 'of', 'in', 'for', 'on', 'with', 'at', 'by', 'from', 'as',
-        'into', 'through', 'during', 'before', 'after', 'above', 'below',
-        'between', 'under', 'again', 'further', 'then', 'once', 'here',
-        'there', 'when', 'where', 'why', 'how', 'all', 'each', 'few', 'more',
-        'most', 'other', 'some', 'such', 'no', 'nor', 'not', 'only', 'own',
-        'same', 'so', 'than', 'too', 'very', 'just', 'and', 'but', 'if', 'or',
-        'because', 'as', 'until', 'while', 'of', 'at', 'by', 'about', 'against',
-        'i', 'me', 'my', 'myself', 'we', 'our', 'you', 'your', 'he', 'him',
-        'she', 'her', 'it', 'its', 'they', 'them', 'what', 'which', 'who',
-        'this', 'that', 'these', 'those', 'am', 'is', 'are', 'was', 'were',
-        'ok', 'okay', 'yes', 'no', 'yeah', 'yep', 'nope', 'sure', 'cool',
-        'great', 'good', 'nice', 'thanks', 'please', 'pls', 'thx', 'ty',
-        'u', 'ur', 'im', 'dont', 'cant', 'wont', 'isnt', 'arent', 'wasnt',
-    }
+    return tuple(w for w in words if w not in STOPWORDS and len(w) > 2)
+
 
-    keywords = [w for w in words if w not in stopwords and len(w) > 2]
-    return keywords
+@lru_cache(maxsize=4096)
+def extract_action_object_pairs(prompt_lc: str) -> Tuple[Tuple[str, str], ...]:
+    """Extract action-object pairs like (commit, changes), (run, tests) from a lowercased prompt."""
+    pairs = [(verb, obj) for verb, obj in ACTION_OBJECT_RE.findall(prompt_lc) if len(obj) > 2]
+    # Stable sort: verb-list order, then text order for the same verb
+    pairs.sort(key=lambda pair: VERB_ORDER[pair[0]])
+    return tuple(pairs)
 
 
-def extract_action_object_pairs(prompt: str) -> List[Tuple[str, str]]:
-    """Extract action-object pairs like (commit, changes), (run, tests)."""
-    prompt_lower = prompt.lower()
-    pairs = []
+def count_prompt_features(prompts_lc: List[str]) -> Tuple[Counter, Counter, Counter]:
+    """Count intents, keywords and action-object pairs over lowercased prompts."""
+    intent_counts = Counter()
+    keyword_counts = Counter()
+    pair_counts = Counter()
 
-    for verb in ACTION_VERBS:
-        # Look for "verb X" or "verb the X" patterns
-        pattern = rf'\b{verb}\s+(?:the\s+)?([a-z][a-z0-9_-]*)'
-        matches = re.findall(pattern, prompt_lower)
-        for obj in matches:
-            if len(obj) > 2:
-                pairs.append((verb, obj))
+    # Analyse each distinct prompt once and weight it by how often it occurs
+    for prompt_lc, times in Counter(prompts_lc).items():
+        # Detect intents
+        for intent in detect_intent(prompt_lc):
+            intent_counts[intent] += times
+
+        # Extract keywords
+        for kw in extract_keywords(prompt_lc):
+            keyword_counts[kw] += times
+
+        # Extract action-object pairs
+        for pair in extract_action_object_pairs(prompt_lc):
+            pair_counts[pair] += times
 
-    return pairs
+    return intent_counts, keyword_counts, pair_counts
 
 
 def analyze_prompt_patterns(prompts: List[dict]) -> dict:
@@ -197,36 +256,30 @@ def analyze_prompt_patterns(prompts: List[dict]) -> dict:
         "prompt_templates": [],
     }
 
-    # Analyze each prompt
-    for p in prompts:
-        prompt = p.get("prompt", "")
-        if not prompt or prompt.startswith("[shell]"):
-            continue
-
-        # Detect intents
-        intents = detect_intent(prompt)
-        for intent in intents:
-            analysis["intent_counts"][intent] += 1
-
-        # Extract keywords
-        keywords = extract_keywords(prompt)
-        for kw in keywords:
-            analysis["keyword_counts"][kw] += 1
-
-        # Extract action-object pairs
-        pairs = extract_action_object_pairs(prompt)
-        for pair in pairs:
-            analysis["action_object_pairs"][pair] += 1
+    # Analyze each prompt, split across worker processes for large logs;
+    # chunks are merged in order so most_common ties come out the same
+    texts = [p["prompt_lc"] for p in prompts if p.get("prompt") and not p["prompt"].startswith("[shell]")]
+    if len(texts) >= PARALLEL_MIN_PROMPTS:
+        size = -(-len(texts) // (os.cpu_count() or 1))
+        with ProcessPoolExecutor() as executor:
+            partials = list(executor.map(count_prompt_features, [texts[i:i + size] for i in range(0, len(texts), size)]))
+    else:
+        partials = [count_prompt_features(texts)]
+
+    for intent_counts, keyword_counts, pair_counts in partials:
+        analysis["intent_counts"].update(intent_counts)
+        analysis["keyword_counts"].update(keyword_counts)
+        analysis["action_object_pairs"].update(pair_counts)
 
     # Find common multi-word phrases (2-3 words)
-    all_prompts_text = " ".join(p.get("prompt", "") for p in prompts if not p.get("prompt", "").startswith("[shell]"))
-    words = all_prompts_text.lower().split()
+    all_prompts_text = " ".join(p["prompt_lc"] for p in prompts if not p.get("prompt", "").startswith("[shell]"))
+    words = all_prompts_text.split()
 
-    # Bigrams
-    for i in range(len(words) - 1):
-        bigram = f"{words[i]} {words[i+1]}"
-        if len(bigram) > 5:
-            analysis["common_phrases"][bigram] += 1
+    # Bigrams, counted as word pairs in one pass and joined afterwards
+    bigrams = Counter(zip(words, words[1:]))
+    analysis["common_phrases"] = Counter({
+        f"{a} {b}": count for (a, b), count in bigrams.items() if len(a) + len(b) + 1 > 5
+    })
 
     # Filter to frequent patterns
     analysis["intent_counts"] = dict(analysis["intent_counts"].most_common(10))
@@ -254,6 +307,11 @@ def correlate_prompts_to_tools(prompts: List[dict], tool_sessions: Dict[str, Lis
         if not session_tools:
             continue
 
+        # Order tools by time once so each prompt can bisect to the first
+        # tool after it
+        session_tools = sorted(session_tools, key=lambda r: r.get("timestamp", ""))
+        tool_times = [r.get("timestamp", "") for r in session_tools]
+
         for prompt_record in session_prompts:
             prompt = prompt_record.get("prompt", "")
             prompt_ts = prompt_record.get("timestamp", "")
@@ -262,16 +320,11 @@ def correlate_prompts_to_tools(prompts: List[dict], tool_sessions: Dict[str, Lis
                 continue
 
             # Find tools that came after this prompt
-            tools_after = []
-            for tool_record in session_tools:
-                tool_ts = tool_record.get("timestamp", "")
-                if tool_ts > prompt_ts:
-                    tools_after.append(tool_record.get("tool"))
-                    if len(tools_after) >= 5:  # Limit to next 5 tools
-                        break
+            start = bisect_right(tool_times, prompt_ts)
+            tools_after = [r.get("tool") for r in session_tools[start:start + 5]]  # Limit to next 5 tools
 
             if tools_after:
-                intents = detect_intent(prompt)
+                intents = detect_intent(prompt_record["prompt_lc"])
                 correlations.append({
                     "prompt_preview": prompt[:100],
                     "intents": intents,
@@ -384,8 +437,8 @@ def run_prompt_analysis(verbose: bool = True) -> dict:
     }
 
     try:
-        with open(PROMPT_PATTERNS, "w") as f:
-            json.dump(results, f, indent=2)
+        with open(PROMPT_PATTERNS, "wb") as f:
+            f.write(json_dumps(results, pretty=True))
         if verbose:
             print(f"\nSaved to: {PROMPT_PATTERNS}")
     except Exception as e:
@@ -6,24 +6,72 @@ Bypasses CLI hooks entirely for true fresh context per iteration
 
 import os
 import sys
-import time
 import argparse
+import json
 import re
-from anthropic import Anthropic, RateLimitError
+from datetime import datetime, timezone
+import asyncio
+import hashlib
+import random
+import shutil
+import httpx
+from anthropic import AsyncAnthropic, APIConnectionError, APIStatusError, DefaultAsyncHttpxClient
+
+try:
+    import h2  # noqa: F401 - httpx only speaks HTTP/2 when h2 is installed
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+FILE_START = '===FILE: '
+FILE_END = '===END FILE==='
+TASK_BLOCK_RE = re.compile(r'===TASK: (\d+)===\r?\n(.*?)===END TASK===', re.DOTALL)
+# Same overall timeout as the SDK default, but give up quickly on connect
+HTTP_TIMEOUT = httpx.Timeout(600.0, connect=10.0)
+ITERATION_SLOT = '{iteration}'  # filled in by fill_system_prompt
+PRINT_LIMIT = 2000  # characters of each response echoed to the console
+MAX_TOKENS = 8192
+TOKENS_EWMA_WEIGHT = 0.3  # weight of the newest response in the output-length average
+PROMISE_TAIL = 512  # characters at the end of a response checked first for the promise
+MAX_ATTEMPTS = 8
+STUCK_REPEATS = 2  # stop after the same output comes back this many more times in a row
+IDLE_ITERATIONS = 3  # stop after this many iterations in a row change no files
+MAX_BACKOFF = 60.0
+RETRYABLE_ERROR_TYPES = {'overloaded_error', 'api_error', 'rate_limit_error'}
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Ralph Fresh Loop via SDK')
-    parser.add_argument('prompt', help='Task prompt')
+    parser.add_argument('prompt', nargs='?', help='Task prompt')
     parser.add_argument('--task-id', default='sdk-task', help='Unique task identifier')
     parser.add_argument('--max-iterations', type=int, default=50, help='Max iterations')
     parser.add_argument('--completion-promise', default='', help='Promise text to detect completion')
     parser.add_argument('--model', default='claude-sonnet-4-20250514', help='Model to use')
-    return parser.parse_args()
+    parser.add_argument('--concurrency', type=int, default=1, help='Iterations to run in parallel')
+    parser.add_argument('--tasks-file', help='JSONL of task prompts to work through in batches')
+    parser.add_argument('--batch-size', type=int, default=4, help='Tasks sent per API call with --tasks-file')
+    parser.add_argument('--stuck-repeats', type=int, default=STUCK_REPEATS,
+                        help='Stop after the same output repeats this many more times in a row (0 disables)')
+    parser.add_argument('--idle-iterations', type=int, default=IDLE_ITERATIONS,
+                        help='Stop after this many iterations in a row change no files (0 disables)')
+    args = parser.parse_args()
+    if not args.prompt and not args.tasks_file:
+        parser.error('a prompt or --tasks-file is required')
+    if args.tasks_file:
+        if args.prompt:
+            parser.error('give either a prompt or --tasks-file, not both')
+        if args.batch_size < 1:
+            parser.error('--batch-size must be at least 1')
+        try:
+            args.tasks = load_tasks(args.tasks_file, args.task_id)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        if not args.tasks:
+            parser.error(f'{args.tasks_file}: no tasks found')
+    return args
 
-def call_claude(client, prompt: str, iteration: int, promise: str, model: str, task_id: str) -> str:
-    """Make a single Claude API call with fresh context."""
-
-    system_prompt = f"""You are Ralph (iteration {iteration}), an autonomous coding agent.
+def build_system_prompt_template(promise: str, task_id: str) -> str:
+    """Build the system prompt once; only the iteration number changes between calls."""
+    return f"""You are Ralph (iteration {ITERATION_SLOT}), an autonomous coding agent.
 You have access to the filesystem and can create/edit files directly.
 Work on the task systematically. Make real changes to files.
 Be concise but thorough.
@@ -43,94 +91,605 @@ IMPORTANT: You are running via API, not CLI. To modify files, output the file co
 
 I will parse these blocks and write the files for you."""
 
+def build_batch_system_prompt_template(promise: str, task_ids: list) -> str:
+    """Build the system prompt template for a call that carries several independent tasks."""
+    return f"""You are Ralph (iteration {ITERATION_SLOT}), an autonomous coding agent.
+You have access to the filesystem and can create/edit files directly.
+You are given {len(task_ids)} independent tasks, numbered TASK 1 to TASK {len(task_ids)}.
+Work on each task systematically. Make real changes to files.
+Be concise but thorough.
+
+Answer each task in its own section, in this format:
+===TASK: <number>===
+<your work on that task, including any file blocks>
+===END TASK===
+
+AT THE END of this iteration, for each task update .claude/ralph-progress-<task id>.md with:
+- What you completed this iteration
+- Files changed
+- Next steps
+- Any blockers
+
+{"Inside a task's section, output <promise>" + promise + "</promise> ONLY when ALL work on that task is genuinely complete." if promise else ""}
+
+IMPORTANT: You are running via API, not CLI. To modify files, output the file content in this format:
+===FILE: /path/to/file.py===
+<file content here>
+===END FILE===
+
+I will parse these blocks and write the files for you."""
+
+def fill_system_prompt(template: str, iteration: int) -> str:
+    """Put the iteration number into a system prompt template."""
+    # The slot comes before any promise or task id text, so the first match is ours
+    return template.replace(ITERATION_SLOT, str(iteration), 1)
+
+def load_tasks(path: str, base_id: str) -> list:
+    """Load (task_id, prompt) pairs from a JSONL file of prompts or {"prompt", "task_id"} objects."""
+    tasks = []
+    with open(path) as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path}:{lineno}: invalid JSON ({e})") from None
+            default_id = f"{base_id}-{len(tasks) + 1}"
+            if isinstance(entry, str):
+                tasks.append((default_id, entry))
+            elif isinstance(entry, dict) and isinstance(entry.get('prompt'), str):
+                tasks.append((entry.get('task_id') or default_id, entry['prompt']))
+            else:
+                raise ValueError(f"{path}:{lineno}: expected a prompt string or an object with a \"prompt\" string")
+    return tasks
+
+def build_batch_prompt(batch: list) -> str:
+    """Combine several (task_id, prompt) pairs into one numbered user message."""
+    return "\n\n".join(f"TASK {n} (id: {task_id}):\n{prompt}" for n, (task_id, prompt) in enumerate(batch, 1))
+
+def split_task_sections(output: str) -> dict:
+    """Map task number to the text of its ===TASK: N=== ... ===END TASK=== section."""
+    return {int(match.group(1)): match.group(2) for match in TASK_BLOCK_RE.finditer(output)}
+
+def error_type(error: Exception) -> str:
+    """The error type from an API error body, e.g. 'overloaded_error'."""
+    body = getattr(error, 'body', None)
+    if isinstance(body, dict):
+        inner = body.get('error', body)
+        if isinstance(inner, dict):
+            return inner.get('type') or ''
+    return ''
+
+def retry_delay(error: Exception, backoff: float):
+    """Seconds to wait before retrying a failed call, or None if it is not retryable."""
+    if isinstance(error, APIStatusError):
+        # Only rate limits and server errors are worth retrying; errors sent
+        # mid-stream arrive with status 200, so also go by the error type
+        if (error.status_code != 429 and error.status_code < 500
+                and error_type(error) not in RETRYABLE_ERROR_TYPES):
+            return None
+        try:
+            wait = float(error.response.headers.get('retry-after') or backoff)
+        except ValueError:
+            wait = backoff
+    else:
+        wait = backoff
+    return wait + random.uniform(0, 0.25 * wait)
+
+def rate_limit_pause(headers) -> float:
+    """Seconds to wait before the next call, based on the rate limit headers."""
+    now = datetime.now(timezone.utc)
+    pause = 0.0
+    # Wait for a reset only when there is not enough budget left for another call
+    for kind, needed in (('requests', 1), ('tokens', MAX_TOKENS)):
+        remaining = headers.get(f'anthropic-ratelimit-{kind}-remaining')
+        reset = headers.get(f'anthropic-ratelimit-{kind}-reset')
+        if remaining is None or reset is None:
+            continue
+        try:
+            if int(remaining) >= needed:
+                continue
+            reset_at = datetime.fromisoformat(reset.replace('Z', '+00:00'))
+        except ValueError:
+            continue
+        pause = max(pause, (reset_at - now).total_seconds())
+    return pause
+
+def next_max_tokens(budget: dict) -> int:
+    """Output token ceiling for the next call: twice the recent average plus headroom."""
+    if budget['ewma'] is None:
+        return MAX_TOKENS
+    return min(MAX_TOKENS, int(2.0 * budget['ewma']) + 512)
+
+def observe_output(budget: dict, message, max_tokens: int):
+    """Fold a response's output length into the average behind next_max_tokens."""
+    if message.stop_reason == 'max_tokens' and max_tokens < MAX_TOKENS:
+        # The lowered ceiling cut this response short; go back to the full limit
+        print(f"⚠️ Output hit max_tokens={max_tokens}; using {MAX_TOKENS} again")
+        budget['ewma'] = None
+        return
+    tokens = message.usage.output_tokens
+    ewma = budget['ewma']
+    budget['ewma'] = tokens if ewma is None else TOKENS_EWMA_WEIGHT * tokens + (1 - TOKENS_EWMA_WEIGHT) * ewma
+
+async def call_claude(client, budget: dict, file_digests: dict, prompt: str, iteration: int, system_template: str, model: str) -> tuple:
+    """Make a single Claude API call with fresh context.
+
+    File blocks are staged to temp files in worker threads as soon as they close
+    in the stream, and only moved into place once the whole response has arrived.
+    Returns (output, files_written, seconds to pause before the next call).
+    """
+    system_prompt = fill_system_prompt(system_template, iteration)
+    backoff = 1.0
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        # Each attempt starts over; nothing carries over from a failed one
+        staged = []
+        made_dirs = []
+        seen_dirs = set()
+        try:
+            output = ''
+            scan_pos = 0
+            max_tokens = next_max_tokens(budget)
+            # Stream so output shows up while the rest of the response is generated
+            async with client.messages.stream(
+                model=model,
+                max_tokens=max_tokens,
+                system=system_prompt,
+                messages=[{"role": "user", "content": prompt}]
+            ) as stream:
+                async for text in stream.text_stream:
+                    # Echo only the first PRINT_LIMIT characters
+                    if len(output) < PRINT_LIMIT:
+                        sys.stdout.write(text[:PRINT_LIMIT - len(output)])
+                        sys.stdout.flush()
+                    output += text
+
+                    # Only rescan once a new end marker has arrived
+                    if FILE_END not in output[-(len(text) + len(FILE_END) - 1):]:
+                        continue
+                    while True:
+                        block = next_file_block(output, scan_pos)
+                        if block is None:
+                            break
+                        filepath, content, scan_pos = block
+                        staged.append(stage_write(staged, filepath, content, file_digests, seen_dirs, made_dirs))
+                pause = rate_limit_pause(stream.response.headers)
+                observe_output(budget, await stream.get_final_message(), max_tokens)
+            sys.stdout.write("...\n" if len(output) > PRINT_LIMIT else "\n")
+            files_written = await apply_staged(staged, file_digests)
+            staged, made_dirs = [], []  # applied; nothing left to clean up
+            return output, files_written, pause
+        except (APIConnectionError, APIStatusError) as e:
+            delay = retry_delay(e, backoff)
+            if delay is None or attempt == MAX_ATTEMPTS:
+                raise
+            print(f"\n⚠️ {type(e).__name__}, retrying in {delay:.1f}s ({attempt}/{MAX_ATTEMPTS})...")
+        finally:
+            # A failed attempt's blocks never reach the target files, and its
+            # temp files are gone before any retry starts
+            await discard_staged(staged, made_dirs)
+        await asyncio.sleep(delay)
+        backoff = min(backoff * 2, MAX_BACKOFF)
+
+async def call_claude_whole(client, sem, budget: dict, prompt: str, iteration: int, system_template: str, model: str) -> tuple:
+    """Make a single non-streaming Claude API call with fresh context, at most N in flight."""
+    system_prompt = fill_system_prompt(system_template, iteration)
+    backoff = 1.0
+
+    async with sem:
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                max_tokens = next_max_tokens(budget)
+                raw = await client.messages.with_raw_response.create(
+                    model=model,
+                    max_tokens=max_tokens,
+                    system=system_prompt,
+                    messages=[{"role": "user", "content": prompt}]
+                )
+                response = await raw.parse()
+                observe_output(budget, response, max_tokens)
+
+                # Hold our slot until the rate limit resets if the budget is spent
+                pause = rate_limit_pause(raw.headers)
+                if pause > 0:
+                    print(f"⏳ Near rate limit (iteration {iteration}), waiting {pause:.1f}s...")
+                    await asyncio.sleep(pause)
+                return iteration, response.content[0].text
+            except (APIConnectionError, APIStatusError) as e:
+                delay = retry_delay(e, backoff)
+                if delay is None or attempt == MAX_ATTEMPTS:
+                    raise
+                print(f"⚠️ {type(e).__name__} (iteration {iteration}), retrying in {delay:.1f}s ({attempt}/{MAX_ATTEMPTS})...")
+                await asyncio.sleep(delay)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+
+def http_client_options(concurrency: int = 1) -> dict:
+    """Keep-alive pool settings so iterations reuse connections."""
+    return {
+        'http2': HTTP2,
+        'limits': httpx.Limits(
+            max_keepalive_connections=max(8, concurrency),
+            max_connections=max(16, concurrency),
+            keepalive_expiry=300.0
+        ),
+        'timeout': HTTP_TIMEOUT,
+    }
+
+def next_file_block(output: str, pos: int):
+    """Find the next complete ===FILE: path=== ... ===END FILE=== block at or after pos.
+
+    Returns (path, content, next_pos), or None if no complete block follows yet.
+    """
+    while True:
+        start = output.find(FILE_START, pos)
+        if start < 0:
+            return None
+        header_end = output.find('\n', start)
+        if header_end < 0:
+            return None
+        end = output.find(FILE_END, header_end + 1)
+        if end < 0:
+            return None
+
+        header = output[start + len(FILE_START):header_end].rstrip('\r')
+        if not header.endswith('===') or not header[:-3].strip():
+            # Not a block header; look for the next one
+            pos = start + len(FILE_START)
+            continue
+
+        return header[:-3].strip(), output[header_end + 1:end], end + len(FILE_END)
+
+def iter_file_blocks(output: str):
+    """Yield (path, content) for each file block in output."""
+    pos = 0
+    while True:
+        block = next_file_block(output, pos)
+        if block is None:
+            return
+        filepath, content, pos = block
+        yield filepath, content
+
+def write_file(filepath: str, content: str, file_digests: dict, seen_dirs: set) -> bool:
+    """Write one file unless it already holds this content; return True if written."""
+    data = content.encode('utf-8')
+
+    # Skip files whose content matches what we last wrote (keeps mtimes stable)
+    digest = hashlib.blake2b(data, digest_size=16).digest()
+    if file_digests.get(filepath) == digest:
+        return False
+
+    # Create directory if needed (once per directory)
+    dirname = os.path.dirname(filepath)
+    if dirname and dirname not in seen_dirs:
+        os.makedirs(dirname, exist_ok=True)
+        seen_dirs.add(dirname)
+
+    # Write to a temp file and rename it into place so a crash never leaves a torn file
+    tmp = filepath + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    replace_file(tmp, filepath)
+    file_digests[filepath] = digest
+    return True
+
+def replace_file(tmp: str, filepath: str):
+    """Rename a fully written temp file over its target, keeping the target's mode."""
     try:
-        response = client.messages.create(
-            model=model,
-            max_tokens=8192,
-            system=system_prompt,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response.content[0].text
-    except RateLimitError:
-        print("⚠️ Rate limited, waiting 30s...")
-        time.sleep(30)
-        return call_claude(client, prompt, iteration, promise, model)
-
-def extract_and_write_files(output: str) -> list:
-    """Extract file blocks from output and write them."""
-    pattern = r'===FILE: (.+?)===\n(.*?)===END FILE==='
+        shutil.copymode(filepath, tmp)  # keep e.g. the executable bit of the old file
+    except FileNotFoundError:
+        pass
+    os.replace(tmp, filepath)
+
+def write_temp(tmp: str, data: bytes, seen_dirs: set, made_dirs: list):
+    """Write a staged block to its temp file, creating (and noting) missing directories."""
+    dirname = os.path.dirname(tmp)
+    if dirname and dirname not in seen_dirs:
+        missing = []
+        parent = dirname
+        while parent and not os.path.isdir(parent):
+            missing.append(parent)
+            parent = os.path.dirname(parent)
+        os.makedirs(dirname, exist_ok=True)
+        made_dirs.extend(missing)
+        seen_dirs.add(dirname)
+    with open(tmp, 'wb') as f:
+        f.write(data)
+
+def stage_write(staged: list, filepath: str, content: str, file_digests: dict, seen_dirs: set, made_dirs: list) -> tuple:
+    """Start writing one streamed block to a temp file; returns (filepath, tmp, digest, task).
+
+    The task is None when the file already holds this content and no earlier
+    block of the same response touched it.
+    """
+    data = content.encode('utf-8')
+    digest = hashlib.blake2b(data, digest_size=16).digest()
+    if file_digests.get(filepath) == digest and all(path != filepath for path, *_ in staged):
+        return filepath, None, digest, None
+    tmp = f"{filepath}.{len(staged)}.tmp"
+    return filepath, tmp, digest, asyncio.create_task(asyncio.to_thread(write_temp, tmp, data, seen_dirs, made_dirs))
+
+async def apply_staged(staged: list, file_digests: dict) -> list:
+    """Move staged blocks into place in stream order; print each outcome and return the paths written."""
+    await asyncio.gather(*(task for *_, task in staged if task is not None))
     files_written = []
+    for filepath, tmp, digest, task in staged:
+        written = task is not None and file_digests.get(filepath) != digest
+        if written:
+            replace_file(tmp, filepath)
+            file_digests[filepath] = digest
+        elif task is not None:
+            os.remove(tmp)
+        if report_write(filepath, written):
+            files_written.append(filepath)
+    return files_written
 
-    for match in re.finditer(pattern, output, re.DOTALL):
-        filepath = match.group(1).strip()
-        content = match.group(2)
+async def discard_staged(staged: list, made_dirs: list):
+    """Wait for staging writes to settle, then remove their temp files and any directories made for them."""
+    await asyncio.gather(*(task for *_, task in staged if task is not None), return_exceptions=True)
+    for _, tmp, _, task in staged:
+        if task is not None:
+            try:
+                os.remove(tmp)
+            except FileNotFoundError:
+                pass
+    # Deepest first; a directory that still holds other files stays
+    for dirname in sorted(set(made_dirs), key=len, reverse=True):
+        try:
+            os.rmdir(dirname)
+        except OSError:
+            pass
 
-        # Create directory if needed
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+async def write_file_after(previous, filepath: str, content: str, file_digests: dict, seen_dirs: set) -> bool:
+    """Write one file in a worker thread once the previous write to the same path has finished."""
+    if previous is not None:
+        await asyncio.wait([previous])
+    return await asyncio.to_thread(write_file, filepath, content, file_digests, seen_dirs)
 
-        with open(filepath, 'w') as f:
-            f.write(content)
+def submit_write(pending: dict, filepath: str, content: str, file_digests: dict, seen_dirs: set):
+    """Start a background file write; writes to one path land in the order started."""
+    task = asyncio.create_task(write_file_after(pending.get(filepath), filepath, content, file_digests, seen_dirs))
+    pending[filepath] = task
+    return task
 
-        files_written.append(filepath)
-        print(f"  📝 Wrote: {filepath}")
+def report_write(filepath: str, written: bool) -> bool:
+    """Print the outcome of one file block."""
+    print(f"  📝 Wrote: {filepath}" if written else f"  ⏭️ Unchanged: {filepath}")
+    return written
 
-    return files_written
+async def report_writes(writes: list) -> list:
+    """Wait for started (path, task) writes, print each outcome and return the paths written."""
+    results = await asyncio.gather(*(task for _, task in writes))
+    return [filepath for (filepath, _), written in zip(writes, results) if report_write(filepath, written)]
 
-def check_promise(output: str, promise: str) -> bool:
-    """Check if completion promise is in output."""
-    if not promise:
-        return False
-    pattern = f'<promise>{re.escape(promise)}</promise>'
-    return bool(re.search(pattern, output))
+def check_promise(output: str, promise_tag: str) -> bool:
+    """Check if a (non-empty) completion promise tag is in output."""
+    # The promise is asked for at the end, so look there before scanning everything
+    return promise_tag in output[-PROMISE_TAIL:] or promise_tag in output
 
-def main():
-    args = parse_args()
+def check_stuck(progress: dict, output: str, files: list) -> str:
+    """Track repeated outputs and iterations that change no files; return why the loop is stuck, or ''."""
+    digest = hashlib.blake2b(output.encode('utf-8'), digest_size=16).digest()
+    progress['repeats'] = progress['repeats'] + 1 if digest == progress['last_digest'] else 0
+    progress['last_digest'] = digest
+    progress['idle'] = 0 if files else progress['idle'] + 1
 
-    if not os.environ.get('ANTHROPIC_API_KEY'):
-        print("❌ ANTHROPIC_API_KEY not set")
-        sys.exit(1)
+    if progress['max_repeats'] and progress['repeats'] >= progress['max_repeats']:
+        return f"same output {progress['repeats'] + 1} times in a row"
+    if progress['max_idle'] and progress['idle'] >= progress['max_idle']:
+        return f"no files changed in {progress['idle']} iterations"
+    return ''
 
-    client = Anthropic()
+def new_progress(args) -> dict:
+    """Fresh state for check_stuck, with the limits from --stuck-repeats and --idle-iterations."""
+    return {'last_digest': None, 'repeats': 0, 'idle': 0,
+            'max_repeats': args.stuck_repeats, 'max_idle': args.idle_iterations}
 
-    print(f"🔄 Starting SDK-based Ralph Loop: {args.task_id}")
-    print(f"   Model: {args.model}")
-    print(f"   Max iterations: {args.max_iterations}")
-    if args.completion_promise:
-        print(f"   Promise: {args.completion_promise}")
-    print("━" * 60)
+async def run_concurrent(client, args, promise_tag: str, system_template: str) -> bool:
+    """Run iterations in parallel; return True once one of them completes."""
+    sem = asyncio.Semaphore(args.concurrency)
+    has_promise = bool(promise_tag)
+    budget = {'ewma': None}
+    file_digests = {}
+    pending = {}
+    seen_dirs = set()
+    writes = []
+    done = False
+    tasks = [
+        asyncio.create_task(call_claude_whole(
+            client,
+            sem,
+            budget,
+            args.prompt,
+            iteration,
+            system_template,
+            args.model
+        ))
+        for iteration in range(1, args.max_iterations + 1)
+    ]
+
+    try:
+        # Handle iterations in the order they finish
+        for next_done in asyncio.as_completed(tasks):
+            iteration, output = await next_done
+            print(f"\n🚀 ITERATION {iteration} | {args.task_id}")
+            print("━" * 60)
+
+            # Print output (truncated)
+            sys.stdout.write(output + "\n" if len(output) <= PRINT_LIMIT else output[:PRINT_LIMIT] + "...\n")
+
+            # Write any files in the background; they are reported once the run ends
+            queued = 0
+            for filepath, content in iter_file_blocks(output):
+                writes.append((filepath, submit_write(pending, filepath, content, file_digests, seen_dirs)))
+                queued += 1
+            if queued:
+                print(f"\n  📥 Queued {queued} file(s)")
+
+            # Check for completion
+            if has_promise and check_promise(output, promise_tag):
+                print(f"\n✅ Ralph loop {args.task_id} complete: Detected promise!")
+                done = True
+                break
+    finally:
+        # Drop any iterations still queued or in flight
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Let writes already started finish even if the run failed
+        await asyncio.gather(*(task for _, task in writes), return_exceptions=True)
+
+    if writes:
+        print()
+        files = await report_writes(writes)
+        if files:
+            print(f"\n  ✅ Wrote {len(files)} file(s)")
+
+    if not done:
+        print(f"\n🛑 Max iterations ({args.max_iterations}) reached")
+    return done
+
+async def run_sequential(client, args, promise_tag: str, system_template: str) -> bool:
+    """Run iterations one after another; return True once one of them completes."""
+    has_promise = bool(promise_tag)
+    budget = {'ewma': None}
+    file_digests = {}
+    progress = new_progress(args)
 
     for iteration in range(1, args.max_iterations + 1):
         print(f"\n🚀 ITERATION {iteration} | {args.task_id}")
         print("━" * 60)
 
-        output = call_claude(
+        output, files, pause = await call_claude(
             client,
+            budget,
+            file_digests,
             args.prompt,
             iteration,
-            args.completion_promise,
-            args.model,
-            args.task_id
+            system_template,
+            args.model
         )
 
-        # Print output (truncated)
-        print(output[:2000] + ("..." if len(output) > 2000 else ""))
-
-        # Extract and write any files
-        files = extract_and_write_files(output)
         if files:
             print(f"\n  ✅ Wrote {len(files)} file(s)")
 
         # Check for completion
-        if check_promise(output, args.completion_promise):
+        if has_promise and check_promise(output, promise_tag):
             print(f"\n✅ Ralph loop {args.task_id} complete: Detected promise!")
-            break
+            return True
 
-        # Brief pause between iterations
-        time.sleep(2)
-    else:
-        print(f"\n🛑 Max iterations ({args.max_iterations}) reached")
+        # Stop early once iterations stop making progress
+        stuck = check_stuck(progress, output, files)
+        if stuck:
+            print(f"\n🛑 Stopping early, the loop looks stuck ({stuck}); "
+                  "tune with --stuck-repeats / --idle-iterations (0 disables)")
+            return False
+
+        # Only pause when the rate limit budget is spent
+        if pause > 0 and iteration < args.max_iterations:
+            print(f"\n⏳ Near rate limit, waiting {pause:.1f}s...")
+            await asyncio.sleep(pause)
+
+    print(f"\n🛑 Max iterations ({args.max_iterations}) reached")
+    return False
+
+async def run_batches(client, args, promise_tag: str) -> bool:
+    """Work through --tasks-file, several tasks per API call; return True once every task completes."""
+    tasks = args.tasks
+    has_promise = bool(promise_tag)
+    budget = {'ewma': None}
+    file_digests = {}
+    all_done = True
+
+    for start in range(0, len(tasks), args.batch_size):
+        remaining = tasks[start:start + args.batch_size]
+        progress = new_progress(args)
+
+        for iteration in range(1, args.max_iterations + 1):
+            task_ids = [task_id for task_id, _ in remaining]
+            print(f"\n🚀 ITERATION {iteration} | {', '.join(task_ids)}")
+            print("━" * 60)
+
+            output, files, pause = await call_claude(
+                client,
+                budget,
+                file_digests,
+                build_batch_prompt(remaining),
+                iteration,
+                build_batch_system_prompt_template(args.completion_promise, task_ids),
+                args.model
+            )
+
+            if files:
+                print(f"\n  ✅ Wrote {len(files)} file(s)")
+
+            # Check each task's own section for completion
+            if has_promise:
+                sections = split_task_sections(output)
+                finished = [n for n in range(1, len(remaining) + 1) if n in sections and check_promise(sections[n], promise_tag)]
+                for n in finished:
+                    print(f"\n✅ Ralph task {remaining[n - 1][0]} complete: Detected promise!")
+                remaining = [task for n, task in enumerate(remaining, 1) if n not in finished]
+                if not remaining:
+                    break
+
+            # Move on to the next batch once iterations stop making progress
+            stuck = check_stuck(progress, output, files)
+            if stuck:
+                print(f"\n🛑 Stopping early, the loop looks stuck ({stuck}); "
+                      "tune with --stuck-repeats / --idle-iterations (0 disables)")
+                print(f"   Giving up on: {', '.join(task_id for task_id, _ in remaining)}")
+                all_done = False
+                break
+
+            # Only pause when the rate limit budget is spent
+            if pause > 0 and iteration < args.max_iterations:
+                print(f"\n⏳ Near rate limit, waiting {pause:.1f}s...")
+                await asyncio.sleep(pause)
+        else:
+            print(f"\n🛑 Max iterations ({args.max_iterations}) reached for: {', '.join(task_id for task_id, _ in remaining)}")
+            all_done = False
+
+    return all_done
+
+async def main():
+    args = parse_args()
+
+    if not os.environ.get('ANTHROPIC_API_KEY'):
+        print("❌ ANTHROPIC_API_KEY not set")
+        sys.exit(1)
+
+    promise_tag = f'<promise>{args.completion_promise}</promise>' if args.completion_promise else ''
+    system_template = build_system_prompt_template(args.completion_promise, args.task_id)
+
+    print(f"🔄 Starting SDK-based Ralph Loop: {args.task_id}")
+    print(f"   Model: {args.model}")
+    print(f"   Max iterations: {args.max_iterations}")
+    if args.tasks_file:
+        print(f"   Tasks: {args.tasks_file} (batches of {args.batch_size})")
+    elif args.concurrency > 1:
+        print(f"   Concurrency: {args.concurrency}")
+    if args.completion_promise:
+        print(f"   Promise: {args.completion_promise}")
+    print("━" * 60)
+
+    client = AsyncAnthropic(
+        http_client=DefaultAsyncHttpxClient(**http_client_options(args.concurrency)),
+        max_retries=0  # retries are handled in call_claude / call_claude_whole
+    )
+
+    try:
+        if args.tasks_file:
+            await run_batches(client, args, promise_tag)
+        else:
+            run = run_concurrent if args.concurrency > 1 else run_sequential
+            await run(client, args, promise_tag, system_template)
+    finally:
+        await client.close()
 
     print("\n✅ SDK loop finished.")
 
 if __name__ == '__main__':
-    main()
+    asyncio.run(main())